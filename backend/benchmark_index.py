@@ -0,0 +1,133 @@
+"""
+Benchmark des types d'index FAISS sur les embeddings de la base de connaissances.
+
+Pour chaque type (flat, hnsw, ivfpq, sq8) : temps de construction, recall@k
+par rapport à la recherche exacte, latence p50/p99 d'une requête, taille
+sérialisée de l'index et mémoire résidente ajoutée par sa construction.
+
+    python benchmark_index.py --k 5 --queries 200
+    python benchmark_index.py --synthetic 100000 --metric ip --output bench_index.json
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+import faiss
+
+from controllers.index_factory import build_index, prepare_vectors, INDEX_TYPES
+
+
+def rss_bytes():
+    """Mémoire résidente du processus (Linux : /proc/self/statm)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def load_embeddings(emb_file, synthetic, seed):
+    embeddings = np.load(emb_file).astype(np.float32)
+    rng = np.random.default_rng(seed)
+    if synthetic and synthetic > len(embeddings):
+        # Répliques bruitées des vrais vecteurs pour simuler une base plus grande
+        picks = rng.integers(0, len(embeddings), synthetic - len(embeddings))
+        noise = rng.normal(0, embeddings.std() * 0.3, (len(picks), embeddings.shape[1])).astype(np.float32)
+        embeddings = np.vstack([embeddings, embeddings[picks] + noise])
+    return embeddings
+
+
+def load_queries(embeddings, n_queries, questions_file, seed):
+    """Questions de data/questions.json encodées si le modèle est disponible, sinon vecteurs perturbés."""
+    try:
+        from controllers.text_processing import normalize_text
+        from sentence_transformers import SentenceTransformer
+
+        with open(questions_file, encoding="utf-8") as f:
+            questions = [normalize_text(q["question"]) for q in json.load(f)]
+        model = SentenceTransformer("all-MiniLM-L6-v2")
+        queries = model.encode(questions, convert_to_numpy=True).astype(np.float32)
+        if queries.shape[1] == embeddings.shape[1]:
+            return queries[:n_queries], "questions.json"
+    except Exception as e:
+        print(f"[WARN] Questions non encodées ({e}), requêtes synthétiques utilisées.")
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(embeddings), n_queries)
+    noise = rng.normal(0, embeddings.std() * 0.5, (n_queries, embeddings.shape[1])).astype(np.float32)
+    return embeddings[picks] + noise, "synthetic"
+
+
+def bench(kind, embeddings, queries, ids, k, metric, ground_truth):
+    before = rss_bytes()
+    started = time.perf_counter()
+    index = build_index(kind, embeddings, ids, metric)
+    build_s = time.perf_counter() - started
+    rss_delta = rss_bytes() - before
+
+    prepared = prepare_vectors(queries, metric)
+    latencies = []
+    found = np.empty((len(queries), k), dtype=np.int64)
+    for i in range(len(prepared)):
+        t = time.perf_counter()
+        found[i] = index.search(prepared[i:i + 1], k)[1][0]
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    recall = np.mean([
+        len(set(found[i].tolist()) & set(ground_truth[i].tolist())) / k for i in range(len(queries))
+    ])
+    return {
+        "index_type": kind,
+        "build_s": round(build_s, 3),
+        f"recall@{k}": round(float(recall), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 4),
+        "serialized_bytes": int(faiss.serialize_index(index).nbytes),
+        "rss_delta_bytes": int(rss_delta),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embeddings", default="embeddings.npy")
+    parser.add_argument("--questions", default="data/questions.json")
+    parser.add_argument("--types", default=",".join(INDEX_TYPES))
+    parser.add_argument("--metric", default="l2", choices=["l2", "ip"])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--synthetic", type=int, default=0, help="nombre total de vecteurs simulés")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="fichier JSON de résultats")
+    args = parser.parse_args()
+
+    embeddings = load_embeddings(args.embeddings, args.synthetic, args.seed)
+    queries, query_source = load_queries(embeddings, args.queries, args.questions, args.seed)
+    ids = np.arange(len(embeddings), dtype=np.int64)
+
+    exact = build_index("flat", embeddings, ids, args.metric)
+    ground_truth = exact.search(prepare_vectors(queries, args.metric), args.k)[1]
+    del exact
+
+    results = {
+        "vectors": int(len(embeddings)),
+        "dim": int(embeddings.shape[1]),
+        "metric": args.metric,
+        "queries": int(len(queries)),
+        "query_source": query_source,
+        "faiss_threads": faiss.omp_get_max_threads(),
+        "indexes": [],
+    }
+    for kind in args.types.split(","):
+        result = bench(kind.strip(), embeddings, queries, ids, args.k, args.metric, ground_truth)
+        results["indexes"].append(result)
+        print(json.dumps(result))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"[DONE] Résultats écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
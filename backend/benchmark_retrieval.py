@@ -0,0 +1,211 @@
+"""
+Benchmark qualité / latence de la récupération (sans appel à Mistral).
+
+Rejoue data/questions.json et les requêtes annotées de data/benchmark_queries.json
+à travers le Retriever configuré par les variables d'environnement habituelles
+(FAISS_INDEX_TYPE, HYBRID_SEARCH, RERANK_ENABLED...) et rapporte :
+- recall@k et MRR sur les requêtes annotées ;
+- la latence par étape (normalize, encode, search, rerank, format) ;
+- le débit via RetrievalService à plusieurs niveaux de concurrence ;
+- le pic de mémoire résidente.
+
+    python benchmark_retrieval.py --output bench_retrieval.json
+    python benchmark_retrieval.py --baseline bench_retrieval.json   # code retour 1 si régression
+
+Le modèle d'embedding doit être présent dans le cache Hugging Face local
+(HF_HUB_OFFLINE=1 pour s'assurer qu'aucun accès réseau n'est tenté).
+"""
+import argparse
+import asyncio
+import json
+import resource
+import time
+import numpy as np
+
+from controllers.text_processing import normalize_text
+from controllers.retrieval import get_retriever
+from controllers.retrieval_service import RetrievalService
+from controllers.mistral_controller import format_chunk_content
+
+STAGES = ("normalize", "encode", "search", "rerank", "format")
+retriever = get_retriever()
+
+
+def percentiles(values):
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+    }
+
+
+def source_names(chunk):
+    # Titre du document conservé et des doublons fusionnés dedans par kb_dedup.py
+    parent = retriever.parent(chunk)
+    titles = [parent.get("title") or parent.get("nom") or ""]
+    titles += [origin["title"] for origin in parent.get("merged_from", [])]
+    return [normalize_text(title) for title in titles]
+
+
+def is_relevant(chunk, expected):
+    names = source_names(chunk)
+    return any(name.startswith(normalize_text(e)) for name in names for e in expected)
+
+
+def run_query(query, top_k):
+    """Exécute une requête étape par étape ; retourne (passages, durées en ms par étape)."""
+    timings = {}
+    t = time.perf_counter()
+    normalized = normalize_text(query)
+    timings["normalize"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    query_emb = retriever.embed_model.encode([normalized], convert_to_numpy=True)
+    timings["encode"] = time.perf_counter() - t
+
+    rerank_before = retriever.reranker.total_ms if retriever.reranker else 0.0
+    t = time.perf_counter()
+    positions = retriever.rank_batch(query_emb, top_k=top_k, queries=[query])[0]
+    search = time.perf_counter() - t
+    rerank = ((retriever.reranker.total_ms - rerank_before) / 1000) if retriever.reranker else 0.0
+    timings["search"] = search - rerank
+    timings["rerank"] = rerank
+
+    t = time.perf_counter()
+    chunks = [retriever.passage(p) for p in positions]
+    "\n\n".join(f"- {format_chunk_content(chunk)}" for chunk in chunks)
+    timings["format"] = time.perf_counter() - t
+    return chunks, {stage: seconds * 1000 for stage, seconds in timings.items()}
+
+
+def evaluate(labeled, top_k):
+    recalls, reciprocal_ranks, misses = [], [], []
+    for item in labeled:
+        chunks, _ = run_query(item["query"], top_k)
+        expected = item["expected"]
+        found = {e for e in expected for c in chunks if is_relevant(c, [e])}
+        recalls.append(len(found) / len(expected))
+        rank = next((i + 1 for i, c in enumerate(chunks) if is_relevant(c, expected)), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+        if rank is None:
+            misses.append(item["query"])
+    return {
+        f"recall@{top_k}": round(float(np.mean(recalls)), 4),
+        "mrr": round(float(np.mean(reciprocal_ranks)), 4),
+        "queries": len(labeled),
+        "misses": misses,
+    }
+
+
+def stage_latencies(queries, top_k, repeat):
+    samples = {stage: [] for stage in STAGES}
+    total = []
+    for _ in range(repeat):
+        for query in queries:
+            _, timings = run_query(query, top_k)
+            for stage in STAGES:
+                samples[stage].append(timings[stage])
+            total.append(sum(timings.values()))
+    result = {stage: percentiles(values) for stage, values in samples.items()}
+    result["total"] = percentiles(total)
+    return result
+
+
+async def throughput(queries, top_k, concurrency, n_requests):
+    service = RetrievalService(retriever)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            await service.retrieve(queries[i % len(queries)], top_k=top_k)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n_requests)))
+    elapsed = time.perf_counter() - started
+    await service.close()
+    return {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "qps": round(n_requests / elapsed, 2),
+        "avg_batch_size": round(service.stats()["avg_batch_size"], 2),
+    }
+
+
+def compare(results, baseline, top_k, recall_tolerance, latency_tolerance):
+    """Liste des régressions par rapport à un fichier de résultats précédent."""
+    regressions = []
+    key = f"recall@{top_k}"
+    for metric in (key, "mrr"):
+        old, new = baseline["quality"].get(metric), results["quality"][metric]
+        if old is not None and new < old - recall_tolerance:
+            regressions.append(f"{metric} : {old} -> {new}")
+    old = baseline["latency"]["total"]["p50_ms"]
+    new = results["latency"]["total"]["p50_ms"]
+    if new > old * (1 + latency_tolerance):
+        regressions.append(f"latence p50 totale : {old} ms -> {new} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", default="data/questions.json")
+    parser.add_argument("--labeled", default="data/benchmark_queries.json")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--concurrency", default="1,4,16,64")
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--output", help="fichier JSON de résultats")
+    parser.add_argument("--baseline", help="résultats précédents à comparer")
+    parser.add_argument("--recall-tolerance", type=float, default=0.01)
+    parser.add_argument("--latency-tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = [q["question"] for q in json.load(f)]
+    with open(args.labeled, encoding="utf-8") as f:
+        labeled = json.load(f)
+    queries = questions + [item["query"] for item in labeled]
+
+    run_query(queries[0], args.k)  # warm-up
+    results = {
+        "config": {
+            "passages": len(retriever.chunks),
+            "embed_backend": retriever.embed_backend,
+            "index_type": retriever.index_type,
+            "metric": retriever.metric,
+            "hybrid": retriever.lexical is not None,
+            "rerank": retriever.reranker is not None,
+            "version": retriever.version,
+            "k": args.k,
+        },
+        "quality": evaluate(labeled, args.k),
+        "latency": stage_latencies(queries, args.k, args.repeat),
+        "throughput": [
+            asyncio.run(throughput(queries, args.k, int(c), args.requests))
+            for c in args.concurrency.split(",")
+        ],
+        # ru_maxrss est en kilo-octets sous Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    if retriever.reranker:
+        results["reranker"] = retriever.reranker.stats()
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"[DONE] Résultats écrits dans {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.k, args.recall_tolerance, args.latency_tolerance)
+        for regression in regressions:
+            print(f"[REGRESSION] {regression}")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
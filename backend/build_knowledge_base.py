@@ -1,5 +1,6 @@
 import os
 import json
+from kb_dedup import dedupe_documents, write_report
 
 base_dir = "scraped_comar"
 output = []
@@ -15,6 +16,9 @@ for root, dirs, files in os.walk(base_dir):
                     "content": content
                 })
 
+output, report = dedupe_documents(output)
+write_report(report)
+
 with open("comar_knowledge_base.json", "w", encoding="utf-8") as out:
     json.dump(output, out, ensure_ascii=False, indent=2)
 
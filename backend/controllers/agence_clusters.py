@@ -0,0 +1,128 @@
+import json
+import hashlib
+import threading
+from collections import OrderedDict, defaultdict
+import numpy as np
+from controllers.agence_controller import locator
+
+MIN_ZOOM = 0
+MAX_ZOOM = 18
+# Above this zoom every agency is sent as an individual point
+CLUSTER_MAX_ZOOM = 13
+# Grid cell size in screen pixels (256 px Web Mercator tiles)
+CELL_PX = 64
+# Rendered (zoom, bbox) payloads kept in memory, least recently used evicted first
+RENDER_CACHE_SIZE = 512
+
+
+def mercator_pixels(lat, lng, zoom):
+    scale = 256 * 2 ** zoom
+    lat = np.clip(lat, -85.0511, 85.0511)
+    x = (lng + 180.0) / 360.0 * scale
+    siny = np.sin(np.radians(lat))
+    y = (0.5 - np.log((1 + siny) / (1 - siny)) / (4 * np.pi)) * scale
+    return x, y
+
+
+def compact_point(index, record):
+    # Small map payload: full details come from /nearby-agences or the agency page
+    return {
+        "id": int(index),
+        "lat": record["latitude"],
+        "lng": record["longitude"],
+        "nom": record.get("nom", ""),
+        "type": record.get("type", ""),
+        "code_agence": record.get("code_agence", ""),
+    }
+
+
+class ClusterLayer:
+    """
+    Grid clusters of agencies precomputed for every zoom level.
+
+    Each level stores cluster centroids and counts as arrays, so a
+    bbox query is a vectorized mask. Single-agency cells and every cell
+    above CLUSTER_MAX_ZOOM are returned as compact points. Rendered
+    payloads and their ETags are memoised per (version, zoom, bbox).
+    """
+
+    def __init__(self, locator, cache_size=RENDER_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._rendered = OrderedDict()
+        self._lock = threading.Lock()
+        self.records = locator.records
+        idx = np.flatnonzero(locator.valid)
+        lat = np.array([self.records[i]["latitude"] for i in idx])
+        lng = np.array([self.records[i]["longitude"] for i in idx])
+        self.version = locator.version
+        self.points = [compact_point(i, self.records[i]) for i in range(len(self.records))]
+
+        self.levels = {}
+        points_level = self._level(idx, lat, lng, [[j] for j in range(len(idx))])
+        for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
+            if zoom > CLUSTER_MAX_ZOOM:
+                self.levels[zoom] = points_level
+                continue
+            x, y = mercator_pixels(lat, lng, zoom)
+            cells = defaultdict(list)
+            for j, cell in enumerate(zip((x // CELL_PX).astype(np.int64), (y // CELL_PX).astype(np.int64))):
+                cells[cell].append(j)
+            self.levels[zoom] = self._level(idx, lat, lng, list(cells.values()))
+
+    def _level(self, idx, lat, lng, groups):
+        return {
+            "lat": np.array([lat[g].mean() for g in groups]),
+            "lng": np.array([lng[g].mean() for g in groups]),
+            "count": np.array([len(g) for g in groups]),
+            "members": [idx[g] for g in groups],
+        }
+
+    def query(self, zoom, bbox=None):
+        level = self.levels[min(max(zoom, MIN_ZOOM), MAX_ZOOM)]
+        mask = np.ones(len(level["count"]), dtype=bool)
+        if bbox is not None:
+            min_lng, min_lat, max_lng, max_lat = bbox
+            mask = (level["lat"] >= min_lat) & (level["lat"] <= max_lat) & \
+                   (level["lng"] >= min_lng) & (level["lng"] <= max_lng)
+
+        clusters, points = [], []
+        for c in np.flatnonzero(mask):
+            if level["count"][c] == 1:
+                points.append(self.points[level["members"][c][0]])
+            else:
+                clusters.append({
+                    "lat": round(float(level["lat"][c]), 6),
+                    "lng": round(float(level["lng"][c]), 6),
+                    "count": int(level["count"][c]),
+                })
+        return {"zoom": zoom, "version": self.version, "clusters": clusters, "points": points}
+
+    def render(self, zoom, bbox=None):
+        """Serialized payload and its strong ETag, built once per (version, zoom, bbox)."""
+        key = (self.version, zoom, bbox)
+        with self._lock:
+            rendered = self._rendered.get(key)
+            if rendered is not None:
+                self._rendered.move_to_end(key)
+                return rendered
+        body = json.dumps(self.query(zoom, bbox), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        rendered = (body, '"' + hashlib.sha1(body).hexdigest() + '"')
+        with self._lock:
+            self._rendered[key] = rendered
+            while len(self._rendered) > self.cache_size:
+                self._rendered.popitem(last=False)
+        return rendered
+
+
+def parse_bbox(value):
+    """Leaflet `toBBoxString()` format: 'west,south,east,north'."""
+    parts = [float(v) for v in value.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox must be 'west,south,east,north'")
+    min_lng, min_lat, max_lng, max_lat = parts
+    if min_lat > max_lat or min_lng > max_lng:
+        raise ValueError("bbox must be 'west,south,east,north'")
+    return min_lng, min_lat, max_lng, max_lat
+
+
+cluster_layer = ClusterLayer(locator)
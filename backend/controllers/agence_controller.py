@@ -1,34 +1,101 @@
 import json
-from math import radians, cos, sin, asin, sqrt
-from typing import List
+import hashlib
+from typing import List, Optional
+import numpy as np
 from models.agence import Agence
+from controllers.text_processing import normalize_text
+from controllers.response_cache import response_cache
+from controllers.kb_store import kb_store
 
-# Load agences data once at startup
-with open("data/split_knowledge_base/agences.json", encoding="utf-8") as f:
-    agences_data = json.load(f)
-
-# Convert raw dicts to Agence models
-agences = [Agence(**{
-    **ag,
-    "latitude": float(ag.get("latitude") or 0),
-    "longitude": float(ag.get("longitude") or 0),
-    "distance_km": 0.0
-}) for ag in agences_data]
-
-def haversine(lon1, lat1, lon2, lat2):
-    # Convert decimal degrees to radians
-    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-
-    # Haversine formula
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-    c = 2 * asin(sqrt(a))
-    r = 6371  # Radius of earth in km
-    return c * r
-
-def find_nearest_agences(user_lat: float, user_lng: float, limit: int = 5) -> List[Agence]:
-    for ag in agences:
-        ag.distance_km = haversine(user_lng, user_lat, ag.longitude, ag.latitude)
-    sorted_agences = sorted(agences, key=lambda x: x.distance_km)
-    return sorted_agences[:limit]
+EARTH_RADIUS_KM = 6371.0
+
+# Load agences data once at startup, from the shared KB store
+agences_data = kb_store.documents("agences")
+
+
+def gouvernorat_key(name: str) -> str:
+    # "Gouvernorat Béja", "beja" and "Béja" all map to "beja"
+    key = " ".join(normalize_text(name or "").split())
+    return key[len("gouvernorat "):] if key.startswith("gouvernorat ") else key
+
+
+def to_unit_vectors(lat_deg, lng_deg):
+    lat, lng = np.radians(lat_deg), np.radians(lng_deg)
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)], axis=-1)
+
+
+class AgenceLocator:
+    """
+    Nearest-agency search over precomputed unit vectors.
+
+    Great-circle distance is derived from the chord length between unit
+    vectors, so a query is one (n, 3) subtraction plus a partial selection.
+    Filters are precomputed boolean masks. Nothing shared is mutated:
+    every call builds its own Agence objects.
+    """
+
+    def __init__(self, records):
+        self.records = [{
+            **ag,
+            "latitude": float(ag.get("latitude") or 0),
+            "longitude": float(ag.get("longitude") or 0),
+        } for ag in records]
+        self.version = hashlib.sha1(
+            json.dumps(self.records, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()[:12]
+        lat = np.array([r["latitude"] for r in self.records], dtype=np.float64)
+        lng = np.array([r["longitude"] for r in self.records], dtype=np.float64)
+        self.points = to_unit_vectors(lat, lng)
+        # Agencies scraped without coordinates are never returned
+        self.valid = (lat != 0) | (lng != 0)
+
+        self.type_masks = {}
+        self.gouvernorat_masks = {}
+        for i, record in enumerate(self.records):
+            for masks, key in ((self.type_masks, record.get("type", "").lower()),
+                               (self.gouvernorat_masks, gouvernorat_key(record.get("gouvernorat", "")))):
+                if key not in masks:
+                    masks[key] = np.zeros(len(self.records), dtype=bool)
+                masks[key][i] = True
+
+    def candidates(self, agence_type: Optional[str] = None, gouvernorat: Optional[str] = None):
+        mask = self.valid
+        empty = np.zeros(len(self.records), dtype=bool)
+        if agence_type:
+            mask = mask & self.type_masks.get(agence_type.lower(), empty)
+        if gouvernorat:
+            mask = mask & self.gouvernorat_masks.get(gouvernorat_key(gouvernorat), empty)
+        return np.flatnonzero(mask)
+
+    def nearest(self, lat: float, lng: float, limit: int = 5, max_km: Optional[float] = None,
+                agence_type: Optional[str] = None, gouvernorat: Optional[str] = None) -> List[Agence]:
+        idx = self.candidates(agence_type, gouvernorat)
+        if limit <= 0 or len(idx) == 0:
+            return []
+        chord = np.linalg.norm(self.points[idx] - to_unit_vectors(lat, lng), axis=1)
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2, 1.0))
+
+        if max_km is not None:
+            within = distances <= max_km
+            idx, distances = idx[within], distances[within]
+        if len(idx) > limit:
+            top = np.argpartition(distances, limit - 1)[:limit]
+            idx, distances = idx[top], distances[top]
+        order = np.argsort(distances, kind="stable")
+        return [Agence(**{**self.records[idx[j]], "distance_km": float(distances[j])}) for j in order]
+
+
+locator = AgenceLocator(agences_data)
+
+
+def find_nearest_agences(user_lat: float, user_lng: float, limit: int = 5, max_km: Optional[float] = None,
+                         agence_type: Optional[str] = None, gouvernorat: Optional[str] = None) -> List[Agence]:
+    return locator.nearest(user_lat, user_lng, limit=limit, max_km=max_km,
+                           agence_type=agence_type, gouvernorat=gouvernorat)
+
+
+def prepared_agences():
+    # Full listing, serialized once per data version
+    return response_cache.get("agences:all", locator.version,
+                              lambda: [Agence(**r).model_dump() for r in locator.records])
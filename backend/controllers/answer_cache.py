@@ -0,0 +1,139 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+CACHE_MAX_SIZE = int(os.getenv("ANSWER_CACHE_MAX_SIZE", "512"))
+CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92"))
+
+
+class AnswerCache:
+    """
+    Cache des réponses de /generate-course à deux niveaux :
+    1. exact : clé = question normalisée ;
+    2. sémantique : similarité cosinus entre l'embedding de la question
+       et ceux des questions déjà en cache, au-dessus de `similarity_threshold`.
+
+    Taille bornée avec éviction LRU, expiration après `ttl` secondes, et
+    invalidation complète quand un nouveau snapshot est publié (`set_version`).
+    Les lectures et écritures d'une autre version (requêtes encore en cours
+    sur l'ancien snapshot) sont ignorées au lieu de vider le cache.
+    """
+
+    def __init__(self, max_size=CACHE_MAX_SIZE, ttl=CACHE_TTL, similarity_threshold=CACHE_SIMILARITY):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.version = None
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # clé -> (valeur, slot, expire_at)
+        self._matrix = None            # embeddings normalisés, une ligne par slot
+        self._slot_keys = [None] * max_size
+        self._free_slots = list(range(max_size - 1, -1, -1))
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _check_version(self, version):
+        if self.version is None:
+            self.version = version
+        return version == self.version
+
+    def set_version(self, version):
+        with self._lock:
+            if version != self.version:
+                self._clear()
+                self.version = version
+
+    def _clear(self):
+        self._entries.clear()
+        self._slot_keys = [None] * self.max_size
+        self._free_slots = list(range(self.max_size - 1, -1, -1))
+
+    def _remove(self, key):
+        _, slot, _ = self._entries.pop(key)
+        self._slot_keys[slot] = None
+        self._free_slots.append(slot)
+
+    def _live(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] < now:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def get(self, key, version):
+        with self._lock:
+            if not self._check_version(version):
+                return None
+            value = self._live(key, time.monotonic())
+            if value is not None:
+                self.exact_hits += 1
+            return value
+
+    def get_similar(self, embedding, version):
+        """Recherche sémantique ; compte un miss si rien ne dépasse le seuil."""
+        with self._lock:
+            if not self._check_version(version):
+                self.misses += 1
+                return None
+            if self._matrix is None or not self._entries:
+                self.misses += 1
+                return None
+            slots = np.fromiter((slot for _, slot, _ in self._entries.values()), dtype=np.int64)
+            scores = self._matrix[slots] @ _unit(embedding)
+            best = int(np.argmax(scores))
+            if scores[best] >= self.similarity_threshold:
+                value = self._live(self._slot_keys[slots[best]], time.monotonic())
+                if value is not None:
+                    self.semantic_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key, embedding, value, version):
+        with self._lock:
+            if not self._check_version(version):
+                return
+            if key in self._entries:
+                self._remove(key)
+            if not self._free_slots:
+                self._remove(next(iter(self._entries)))  # LRU
+            vector = _unit(embedding)
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_size, vector.shape[0]), dtype=np.float32)
+            slot = self._free_slots.pop()
+            self._matrix[slot] = vector
+            self._slot_keys[slot] = key
+            self._entries[key] = (value, slot, time.monotonic() + self.ttl)
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "version": self.version,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            }
+
+
+def _unit(embedding):
+    vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,63 @@
+import os
+
+# Taille des passages (en mots) et recouvrement entre deux passages consécutifs.
+# all-MiniLM-L6-v2 tronque à 256 tokens : ~150 mots français restent sous la limite.
+CHUNK_WINDOW = int(os.getenv("CHUNK_WINDOW", "150"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "30"))
+
+# Champs du document parent recopiés dans les métadonnées d'un passage
+PARENT_FIELDS = ("title", "nom", "url", "page_url", "type", "gouvernorat", "code_agence", "source", "page")
+
+
+def split_words(text, window=CHUNK_WINDOW, overlap=CHUNK_OVERLAP):
+    """
+    Découpe un texte en fenêtres glissantes de `window` mots
+    qui se recouvrent de `overlap` mots.
+    """
+    if window <= 0 or not 0 <= overlap < window:
+        raise ValueError("CHUNK_WINDOW doit être > 0 et CHUNK_OVERLAP dans [0, CHUNK_WINDOW[")
+    words = text.split()
+    if not words:
+        return []
+    step = window - overlap
+    return [
+        " ".join(words[start:start + window])
+        for start in range(0, max(len(words) - overlap, 1), step)
+    ]
+
+
+def parent_metadata(doc):
+    return {key: doc[key] for key in PARENT_FIELDS if doc.get(key)}
+
+
+def build_passages(kb, text_fn, window=CHUNK_WINDOW, overlap=CHUNK_OVERLAP):
+    """
+    Transforme la base de connaissances en passages indexables.
+
+    Chaque passage porte `chunk_id` (sa ligne dans l'index), `parent_id`
+    (l'indice du document source dans `kb`) et `position` (rang du passage
+    dans son document). Les pages scrapées (`title`/`content`) sont découpées ;
+    les fiches structurées (agences, santé) restent entières tant qu'elles
+    tiennent dans une fenêtre.
+    """
+    passages = []
+    for parent_id, doc in enumerate(kb):
+        content = doc.get("content")
+        if isinstance(content, str) and content.strip():
+            title, body = doc.get("title", ""), content
+        else:
+            text = text_fn(doc)
+            if len(text.split()) <= window:
+                passages.append({**doc, "chunk_id": len(passages), "parent_id": parent_id, "position": 0})
+                continue
+            title, body = doc.get("nom", ""), text
+
+        for position, piece in enumerate(split_words(body, window, overlap)):
+            passages.append({
+                "title": title,
+                "content": piece,
+                "chunk_id": len(passages),
+                "parent_id": parent_id,
+                "position": position,
+            })
+    return passages
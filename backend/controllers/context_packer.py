@@ -0,0 +1,186 @@
+import os
+import re
+import math
+import logging
+import threading
+import numpy as np
+from controllers.text_processing import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Budget de tokens pour la partie "Base de connaissances" du prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1000"))
+# Passages récupérés parmi lesquels le packer choisit
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "8"))
+# Plafond par passage : une page très longue ne peut pas occuper tout le budget
+CONTEXT_CHUNK_MAX_TOKENS = int(os.getenv("CONTEXT_CHUNK_MAX_TOKENS", "400"))
+# Compromis pertinence / diversité de la sélection MMR (1.0 = pertinence seule)
+MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+# Tokenizer Hugging Face servant au comptage (ex. celui du modèle Mistral) ;
+# à défaut, celui du modèle d'embedding
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER")
+# En dessous, un passage tronqué n'apporte plus rien
+MIN_CHUNK_TOKENS = 24
+# Ce qu'envoyait l'ancien prompt : les 5 premiers passages, entiers
+BASELINE_CHUNKS = 5
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?;])\s+|\n+")
+# Les tableaux extraits des PDF n'ont pas de ponctuation : les "phrases" plus
+# longues sont découpées en segments de SEGMENT_WORDS mots
+SEGMENT_WORDS = 40
+WORD_PIECES = re.compile(r"\w+|[^\w\s]")
+
+
+class TokenCounter:
+    """
+    Compte les tokens avec un tokenizer Hugging Face (`tokenizer_name`,
+    sinon `fallback`). Sans tokenizer, estimation par mots et ponctuation.
+    """
+
+    def __init__(self, tokenizer_name=CONTEXT_TOKENIZER, fallback=None):
+        self.tokenizer = None
+        if tokenizer_name:
+            try:
+                from transformers import AutoTokenizer
+                self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+            except Exception as e:
+                logger.warning("Tokenizer %s indisponible (%s), repli sur le tokenizer d'embedding", tokenizer_name, e)
+        if self.tokenizer is None:
+            self.tokenizer = fallback
+
+    def count(self, texts):
+        if not texts:
+            return []
+        if hasattr(self.tokenizer, "encode_batch"):
+            # Tokenizer de la bibliothèque `tokenizers` (backend ONNX)
+            return [len(e.ids) for e in self.tokenizer.encode_batch(list(texts), add_special_tokens=False)]
+        if self.tokenizer is not None:
+            return [len(ids) for ids in self.tokenizer(list(texts), add_special_tokens=False)["input_ids"]]
+        # ~1.3 token par mot pour un tokenizer sous-mot sur du français
+        return [math.ceil(len(WORD_PIECES.findall(text)) * 1.3) for text in texts]
+
+
+def query_terms(query):
+    return {term for term in normalize_text(query).split() if len(term) > 2}
+
+
+def trim_to_relevant(text, terms, max_tokens, counter):
+    """
+    Réduit `text` à ses phrases les plus proches de la question (termes communs,
+    normalisés par la longueur), dans l'ordre d'origine, sans dépasser `max_tokens`.
+    """
+    sentences = []
+    for sentence in SENTENCE_SPLIT.split(text):
+        words = sentence.split()
+        sentences.extend(" ".join(words[i:i + SEGMENT_WORDS]) for i in range(0, len(words), SEGMENT_WORDS))
+    if not sentences:
+        return "", 0
+    lengths = counter.count(sentences)
+    scores = []
+    for position, sentence in enumerate(sentences):
+        overlap = len(terms & set(normalize_text(sentence).split()))
+        scores.append((overlap / math.sqrt(lengths[position] + 1), -position))
+
+    kept, used = [], 0
+    for position in sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True):
+        if used + lengths[position] <= max_tokens:
+            kept.append(position)
+            used += lengths[position]
+    if not kept:
+        # Une seule phrase dépasse le plafond : on garde son début
+        best = max(range(len(sentences)), key=lambda i: scores[i])
+        words = sentences[best].split()
+        cut = max(1, int(len(words) * max_tokens / max(lengths[best], 1)))
+        truncated = " ".join(words[:cut])
+        return truncated, counter.count([truncated])[0]
+    return " ".join(sentences[i] for i in sorted(kept)), used
+
+
+def mmr_order(query_emb, embeddings, lambda_=MMR_LAMBDA):
+    """Ordre Maximal Marginal Relevance des candidats (similarités cosinus)."""
+    if len(embeddings) == 0:
+        return []
+    docs = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_emb, dtype=np.float32).reshape(-1)
+    query = query / max(np.linalg.norm(query), 1e-12)
+    relevance = docs @ query
+    pairwise = docs @ docs.T
+
+    order = [int(np.argmax(relevance))]
+    redundancy = pairwise[order[0]].copy()
+    remaining = set(range(len(docs))) - set(order)
+    while remaining:
+        candidates = np.array(sorted(remaining))
+        scores = lambda_ * relevance[candidates] - (1 - lambda_) * redundancy[candidates]
+        best = int(candidates[np.argmax(scores)])
+        order.append(best)
+        remaining.discard(best)
+        redundancy = np.maximum(redundancy, pairwise[best])
+    return order
+
+
+class ContextPacker:
+    """
+    Remplit le budget de tokens du contexte : passages choisis par MMR
+    (pertinents mais non redondants), chacun réduit à ses phrases les plus
+    pertinentes quand il dépasse son plafond ou le budget restant.
+    """
+
+    def __init__(self, budget=CONTEXT_TOKEN_BUDGET, chunk_max_tokens=CONTEXT_CHUNK_MAX_TOKENS,
+                 lambda_=MMR_LAMBDA, counter=None):
+        self.budget = budget
+        self.chunk_max_tokens = chunk_max_tokens
+        self.lambda_ = lambda_
+        self.counter = counter
+        self._lock = threading.Lock()
+        self.packed = 0
+        self.tokens_used = 0
+        self.tokens_saved = 0
+
+    def pack(self, query, query_emb, chunks, embeddings, text_fn):
+        """
+        Retourne (passages retenus, stats). Chaque passage retenu porte son texte
+        final dans `content` ; `stats` compare au prompt des 5 passages entiers.
+        """
+        if self.counter is None:
+            self.counter = TokenCounter()
+        texts = [text_fn(chunk) for chunk in chunks]
+        lengths = self.counter.count(texts)
+        baseline = sum(lengths[:BASELINE_CHUNKS])
+        terms = query_terms(query)
+
+        packed, used = [], 0
+        for i in mmr_order(query_emb, embeddings, self.lambda_):
+            remaining = self.budget - used
+            if remaining < MIN_CHUNK_TOKENS:
+                break
+            limit = min(self.chunk_max_tokens, remaining)
+            text, tokens = texts[i], lengths[i]
+            if tokens > limit:
+                text, tokens = trim_to_relevant(text, terms, limit, self.counter)
+                if tokens < MIN_CHUNK_TOKENS:
+                    continue
+            packed.append((i, {**chunks[i], "content": text}))
+            used += tokens
+        # Ordre de la récupération dans le prompt
+        packed = [chunk for _, chunk in sorted(packed, key=lambda item: item[0])]
+
+        stats = {"candidates": len(chunks), "selected": len(packed), "tokens": used,
+                 "baseline_tokens": baseline, "saved_tokens": baseline - used}
+        with self._lock:
+            self.packed += 1
+            self.tokens_used += used
+            self.tokens_saved += baseline - used
+        return packed, stats
+
+    def stats(self):
+        with self._lock:
+            return {
+                "budget": self.budget,
+                "packed": self.packed,
+                "avg_tokens": round(self.tokens_used / self.packed, 1) if self.packed else None,
+                "tokens_saved": self.tokens_saved,
+            }
+
+
+context_packer = ContextPacker()
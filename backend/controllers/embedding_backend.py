@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import threading
+import numpy as np
+
+# Backend d'embedding : torch (sentence-transformers) | onnx | onnx-int8
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+# Threads intra-op du backend (0 : valeur par défaut du runtime)
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+# Modèles exportés par export_onnx.py : <ONNX_MODEL_DIR>/<nom du modèle>/
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "data/onnx")
+
+EMBED_BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model.int8.onnx"}
+CONFIG_FILE = "embedding_config.json"
+
+
+def onnx_model_dir(model_name, root=ONNX_MODEL_DIR):
+    return os.path.join(root, model_name.replace("/", "__"))
+
+
+class OnnxEmbedder:
+    """
+    Même modèle que SentenceTransformer(model_name), exécuté par onnxruntime.
+
+    Le graphe exporté produit les états cachés du transformer ; le mean
+    pooling masqué et la normalisation L2 de sentence-transformers sont
+    refaits en numpy. Tokenizer (bibliothèque `tokenizers`, sans torch) et
+    session sont créés une fois ; les tenseurs d'entrée sont écrits dans des
+    buffers alloués à la construction et réutilisés à chaque batch. Le modèle
+    est partagé entre threads (requêtes, reconstruction d'un snapshot) : un
+    verrou réserve les buffers à un batch à la fois.
+    """
+
+    def __init__(self, model_name, backend="onnx", model_root=ONNX_MODEL_DIR,
+                 threads=EMBED_THREADS, batch_size=EMBED_BATCH_SIZE):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        directory = onnx_model_dir(model_name, model_root)
+        self.model_path = os.path.join(directory, ONNX_FILES[backend])
+        if not os.path.exists(self.model_path):
+            raise RuntimeError(
+                f"Modèle {self.model_path} introuvable : lancer `python export_onnx.py --model {model_name}`"
+            )
+        with open(os.path.join(directory, CONFIG_FILE), encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.backend = backend
+        self.threads = threads
+        self.batch_size = batch_size
+        self.max_length = self.config["max_seq_length"]
+        self.normalize = self.config["normalize"]
+        self.version = f"{backend} onnxruntime {onnxruntime.__version__} ({self.config['source_version']})"
+
+        tokenizer_file = os.path.join(directory, "tokenizer.json")
+        self._batch_tokenizer = Tokenizer.from_file(tokenizer_file)
+        self._batch_tokenizer.enable_truncation(max_length=self.max_length)
+        self._batch_tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+        # Copie sans troncature ni padding, pour compter les tokens (TokenCounter)
+        self.tokenizer = Tokenizer.from_file(tokenizer_file)
+        self.tokenizer.no_truncation()
+        self.tokenizer.no_padding()
+        self.input_names = self.config["input_names"]
+        # Buffers plats : une vue (n, longueur) reste contiguë quelle que soit la longueur du batch
+        self._buffers = {name: np.zeros(batch_size * self.max_length, dtype=np.int64) for name in self.input_names}
+        self._lock = threading.Lock()
+        self._open_session()
+
+    def _open_session(self):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+        self.session = onnxruntime.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+
+    def after_fork(self):
+        # Le pool de threads d'onnxruntime ne survit pas au fork : session recréée s'il en utilise un
+        if self.threads != 1:
+            self._open_session()
+
+    def get_sentence_embedding_dimension(self):
+        return self.config["dimension"]
+
+    def encode(self, sentences, batch_size=None, convert_to_numpy=True, **kwargs):
+        """Même contrat que SentenceTransformer.encode (tableau float32 (n, dim))."""
+        single = isinstance(sentences, str)
+        sentences = [sentences] if single else list(sentences)
+        batch_size = min(batch_size or self.batch_size, self.batch_size)
+        output = np.empty((len(sentences), self.config["dimension"]), dtype=np.float32)
+        for start in range(0, len(sentences), batch_size):
+            output[start:start + batch_size] = self._encode_batch(sentences[start:start + batch_size])
+        return output[0] if single else output
+
+    def _encode_batch(self, sentences):
+        encodings = self._batch_tokenizer.encode_batch(sentences)
+        n, length = len(encodings), len(encodings[0].ids)
+        fields = {"input_ids": "ids", "attention_mask": "attention_mask", "token_type_ids": "type_ids"}
+        # Verrou par batch : une requête passe entre deux batches d'un réencodage complet
+        with self._lock:
+            feeds = {}
+            for name in self.input_names:
+                view = self._buffers[name][:n * length].reshape(n, length)
+                view[:] = [getattr(encoding, fields[name]) for encoding in encodings]
+                feeds[name] = view
+            hidden = self.session.run(None, feeds)[0]
+            # Copie du masque : les buffers sont libérés pour le batch suivant
+            mask = feeds["attention_mask"][:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if self.normalize:
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled
+
+
+def load_embed_model(model_name, backend=EMBED_BACKEND, threads=EMBED_THREADS):
+    """Modèle d'embedding du backend demandé ; torch n'est importé que pour le backend torch."""
+    if backend not in EMBED_BACKENDS:
+        raise ValueError(f"Backend d'embedding inconnu : {backend} (attendu : {', '.join(EMBED_BACKENDS)})")
+    if backend != "torch":
+        return OnnxEmbedder(model_name, backend, threads=threads)
+    from sentence_transformers import SentenceTransformer
+
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    return SentenceTransformer(model_name)
+
+
+def embed_model_version(model):
+    """Identifie les embeddings produits : un changement de backend invalide l'index."""
+    if isinstance(model, OnnxEmbedder):
+        return model.version
+    return f"sentence-transformers {sys.modules['sentence_transformers'].__version__}"
@@ -0,0 +1,85 @@
+import os
+import math
+import numpy as np
+import faiss
+
+# Type d'index FAISS : flat | hnsw | ivfpq | sq8
+INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+# Métrique : "l2" (distance euclidienne) ou "ip" (produit scalaire sur vecteurs normalisés = cosinus)
+INDEX_METRIC = os.getenv("FAISS_METRIC", "l2")
+
+HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "0"))   # 0 : choisi selon le nombre de vecteurs
+IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", "8"))
+PQ_M = int(os.getenv("FAISS_PQ_M", "0"))             # 0 : dimension / 8
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq", "sq8")
+# Seul l'index exact supporte remove_ids sans reconstruction
+INCREMENTAL_TYPES = ("flat",)
+
+
+def prepare_vectors(vectors, metric=INDEX_METRIC):
+    """Copie float32 contiguë, normalisée L2 si la métrique est le produit scalaire."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32).copy()
+    if metric == "ip":
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def _faiss_metric(metric):
+    if metric not in ("l2", "ip"):
+        raise ValueError(f"Métrique FAISS inconnue : {metric}")
+    return faiss.METRIC_INNER_PRODUCT if metric == "ip" else faiss.METRIC_L2
+
+
+def _pq_subquantizers(dim, requested=PQ_M):
+    m = requested or max(1, dim // 8)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def build_index(kind, embeddings, ids, metric=INDEX_METRIC):
+    """
+    Construit un index FAISS du type demandé sur `embeddings`, adressé par `ids`
+    (IndexIDMap2). Les index compressés (ivfpq, sq8) sont entraînés sur les
+    vecteurs eux-mêmes.
+    """
+    vectors = prepare_vectors(embeddings, metric)
+    n, dim = vectors.shape
+    faiss_metric = _faiss_metric(metric)
+
+    if kind == "flat":
+        base = faiss.IndexFlatIP(dim) if metric == "ip" else faiss.IndexFlatL2(dim)
+    elif kind == "hnsw":
+        base = faiss.IndexHNSWFlat(dim, HNSW_M, faiss_metric)
+        base.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif kind == "sq8":
+        base = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss_metric)
+        base.train(vectors)
+    elif kind == "ivfpq":
+        nlist = IVF_NLIST or max(1, min(int(4 * math.sqrt(n)), n // 39))
+        # 2^nbits centroïdes par sous-quantificateur : il faut au moins autant de vecteurs
+        nbits = max(1, min(8, int(math.log2(max(n, 2)))))
+        quantizer = faiss.IndexFlatIP(dim) if metric == "ip" else faiss.IndexFlatL2(dim)
+        base = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim), nbits, faiss_metric)
+        base.train(vectors)
+    else:
+        raise ValueError(f"Type d'index FAISS inconnu : {kind} (attendu : {', '.join(INDEX_TYPES)})")
+
+    index = faiss.IndexIDMap2(base)
+    index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+    configure_search(index)
+    return index
+
+
+def configure_search(index, nprobe=IVF_NPROBE, ef_search=HNSW_EF_SEARCH):
+    """Paramètres de recherche (non sérialisés par FAISS) à réappliquer après read_index."""
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(base, faiss.IndexIVF):
+        base.nprobe = nprobe
+    elif isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = ef_search
+    return index
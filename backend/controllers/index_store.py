@@ -0,0 +1,169 @@
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+import faiss
+from controllers.index_factory import (
+    build_index, configure_search, prepare_vectors, INDEX_TYPE, INDEX_METRIC, INCREMENTAL_TYPES,
+)
+
+MANIFEST_VERSION = 1
+# Index et embeddings ouverts en mmap : les pages viennent du cache disque et
+# sont partagées entre tous les workers de la machine au lieu d'être copiées
+INDEX_MMAP = os.getenv("INDEX_MMAP", "true").lower() in ("1", "true", "yes")
+
+
+def mmap_flags(index_type):
+    # IO_FLAG_MMAP : listes inversées des index IVF ; IO_FLAG_MMAP_IFC : codes des
+    # index plats (flat, HNSW, sq8). Les deux combinés échouent sur un IVF.
+    return faiss.IO_FLAG_MMAP if index_type == "ivfpq" else faiss.IO_FLAG_MMAP_IFC
+
+
+def chunk_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def hash_to_id(digest):
+    # 60 bits du hash : identifiant FAISS stable tant que le texte ne change pas
+    return int(digest[:15], 16)
+
+
+def atomic_write(path, write):
+    """Écrit via `write(tmp_path)` dans un fichier temporaire du même dossier, puis le renomme."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("manifest_version") == MANIFEST_VERSION else None
+
+
+def _load_embeddings(manifest, emb_file, mmap=False):
+    """Embeddings décrits par le manifeste, ou None s'ils sont absents ou incohérents."""
+    if not os.path.exists(emb_file):
+        return None
+    embeddings = np.load(emb_file, mmap_mode="r" if mmap else None)
+    return embeddings if embeddings.shape[0] == len(manifest["hashes"]) else None
+
+
+def _load_index(manifest, index_file, index_type, metric, mmap=False):
+    """Index décrit par le manifeste ; mappé en mémoire, il est en lecture seule."""
+    if manifest.get("index_type") != index_type or manifest.get("metric") != metric:
+        return None
+    if not os.path.exists(index_file):
+        return None
+    index = faiss.read_index(index_file, mmap_flags(index_type) if mmap else 0)
+    return configure_search(index) if index.ntotal == len(manifest["hashes"]) else None
+
+
+def sync_index(texts, encode, model_name, model_version,
+               index_file="faiss.index", emb_file="embeddings.npy",
+               manifest_file="index_manifest.json",
+               index_type=INDEX_TYPE, metric=INDEX_METRIC, mmap=INDEX_MMAP, log=print):
+    """
+    Met l'index FAISS en cohérence avec `texts` (un texte normalisé par passage).
+
+    Le manifeste mémorise le hash de chaque passage indexé ainsi que le modèle
+    d'embedding. Seuls les passages nouveaux ou modifiés sont encodés. Pour
+    l'index exact, les passages disparus sont retirés de l'index (IndexIDMap2,
+    identifiants dérivés du hash) ; les index approchés ou compressés sont
+    reconstruits à partir des embeddings conservés, sans ré-encoder. Les textes
+    identiques ne sont indexés qu'une fois. Les artefacts sont écrits de façon
+    atomique, le manifeste en dernier. Avec `mmap=True`, l'index et les
+    embeddings retournés sont des vues en lecture seule des fichiers.
+
+    Retourne (index, embeddings, ids, rows, fingerprint) où `ids[i]` est
+    l'identifiant FAISS du passage i et `rows[i]` sa ligne dans `embeddings`.
+    """
+    hashes = [chunk_hash(text) for text in texts]
+    ids = np.array([hash_to_id(h) for h in hashes], dtype=np.int64)
+    unique = list(dict.fromkeys(hashes))
+    row_of = {h: row for row, h in enumerate(unique)}
+    rows = np.array([row_of[h] for h in hashes], dtype=np.int64)
+    fingerprint = hashlib.sha1(
+        "\n".join([model_name, model_version, index_type, metric] + sorted(unique)).encode("utf-8")
+    ).hexdigest()[:12]
+
+    manifest = load_manifest(manifest_file)
+    embeddings = index = None
+    if manifest and manifest["model"] == model_name and manifest["model_version"] == model_version:
+        embeddings = _load_embeddings(manifest, emb_file, mmap)
+        if embeddings is not None:
+            index = _load_index(manifest, index_file, index_type, metric, mmap)
+    if index is not None and manifest["fingerprint"] == fingerprint:
+        log(f"[INFO] Index {index_type} à jour ({len(unique)} vecteurs, empreinte {fingerprint}).")
+        return index, embeddings, ids, rows, fingerprint
+
+    old_rows = {}
+    if embeddings is not None:
+        old_rows = {h: row for row, h in enumerate(manifest["hashes"])}
+
+    wanted = set(unique)
+    added = [h for h in unique if h not in old_rows]
+    removed = [h for h in old_rows if h not in wanted]
+    log(f"[INFO] Mise à jour de l'index : {len(added)} passages à encoder, "
+        f"{len(removed)} à retirer, {len(unique) - len(added)} réutilisés.")
+
+    text_by_hash = dict(zip(hashes, texts))
+    new_embeddings = None
+    if added:
+        new_embeddings = np.asarray(encode([text_by_hash[h] for h in added]), dtype=np.float32)
+
+    # Embeddings réordonnés selon `unique` : lignes réutilisées + nouvelles lignes
+    added_rows = {h: row for row, h in enumerate(added)}
+    embeddings = np.stack([
+        embeddings[old_rows[h]] if h in old_rows else new_embeddings[added_rows[h]]
+        for h in unique
+    ]).astype(np.float32)
+
+    if index is not None and index_type in INCREMENTAL_TYPES:
+        if mmap:
+            # Un index mappé ne peut pas être modifié : copie en mémoire le temps de la mise à jour
+            index = _load_index(manifest, index_file, index_type, metric)
+        if removed:
+            index.remove_ids(np.array([hash_to_id(h) for h in removed], dtype=np.int64))
+        if added:
+            index.add_with_ids(prepare_vectors(new_embeddings, metric),
+                               np.array([hash_to_id(h) for h in added], dtype=np.int64))
+    else:
+        index = build_index(index_type, embeddings, [hash_to_id(h) for h in unique], metric)
+
+    atomic_write(index_file, lambda tmp: faiss.write_index(index, tmp))
+    atomic_write(emb_file, lambda tmp: np.save(tmp, embeddings))
+    new_manifest = {
+        "manifest_version": MANIFEST_VERSION,
+        "model": model_name,
+        "model_version": model_version,
+        "index_type": index_type,
+        "metric": metric,
+        "dim": int(embeddings.shape[1]),
+        "fingerprint": fingerprint,
+        "hashes": unique,
+    }
+    atomic_write(manifest_file, lambda tmp: _write_json(tmp, new_manifest))
+    if mmap:
+        # Les copies en mémoire sont remplacées par des vues des fichiers écrits
+        embeddings = _load_embeddings(new_manifest, emb_file, mmap)
+        index = _load_index(new_manifest, index_file, index_type, metric, mmap)
+    log(f"[INFO] Index {index_type} sauvegardé ({index.ntotal} vecteurs, empreinte {fingerprint}).")
+    return index, embeddings, ids, rows, fingerprint
+
+
+def _write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
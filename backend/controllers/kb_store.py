@@ -0,0 +1,280 @@
+import os
+import json
+import mmap
+import logging
+import shutil
+import hashlib
+import tempfile
+from collections.abc import Sequence
+from contextlib import contextmanager, nullcontext
+import numpy as np
+from controllers.text_processing import normalize_text, get_text_for_embedding
+from controllers.chunking import build_passages, CHUNK_WINDOW, CHUNK_OVERLAP
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# JSON par section produits par split_knowledge_base.py, et artefact compilé
+KB_SOURCE_DIR = os.getenv("KB_SOURCE_DIR", "data/split_knowledge_base")
+KB_STORE_DIR = os.getenv("KB_STORE_DIR", "data/kb_store")
+# Verrou partagé par les workers de la machine pendant l'écriture du store et de l'index
+SNAPSHOT_LOCK_FILE = os.getenv("SNAPSHOT_LOCK_FILE", f"{KB_STORE_DIR}.lock")
+STORE_VERSION = 1
+# Versions compilées conservées dans `<store>.versions` : la publiée et la précédente
+KEEP_VERSIONS = 2
+
+
+@contextmanager
+def build_lock(path=SNAPSHOT_LOCK_FILE):
+    """Un seul processus à la fois reconstruit le store et l'index ; les autres réutilisent son travail."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def source_fingerprint(source_dir):
+    """Empreinte des fichiers sources (nom, taille, mtime) : un stat par fichier, sans lecture."""
+    digest = hashlib.sha1()
+    for filename in sorted(os.listdir(source_dir)):
+        if filename.endswith(".json"):
+            stat = os.stat(os.path.join(source_dir, filename))
+            digest.update(f"{filename}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def write_blob(directory, name, texts):
+    """Concatène les textes UTF-8 dans `<name>.bin` ; `<name>.offsets.npy` donne les bornes."""
+    encoded = [text.encode("utf-8") for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(data) for data in encoded], out=offsets[1:])
+    with open(os.path.join(directory, f"{name}.bin"), "wb") as f:
+        for data in encoded:
+            f.write(data)
+    np.save(os.path.join(directory, f"{name}.offsets.npy"), offsets)
+
+
+class TextBlob(Sequence):
+    """Textes d'un blob mappé en mémoire : seules les pages lues sont chargées."""
+
+    def __init__(self, directory, name):
+        self.offsets = np.load(os.path.join(directory, f"{name}.offsets.npy"), mmap_mode="r")
+        with open(os.path.join(directory, f"{name}.bin"), "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._data[int(self.offsets[i]):int(self.offsets[i + 1])].decode("utf-8")
+
+
+class RecordBlob(TextBlob):
+    """Variante de TextBlob dont chaque entrée est un dict JSON, décodé à la lecture."""
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return json.loads(super().__getitem__(i))
+
+
+class KBStore(Sequence):
+    """
+    Base de connaissances compilée, en lecture seule et partagée par tous les contrôleurs.
+
+    Documents, passages et textes d'embedding sont stockés chacun dans un
+    blob unique avec un tableau d'offsets ; les métadonnées sont en colonnes
+    numpy (section de chaque document, document parent de chaque passage).
+    Tout est mappé en mémoire : l'ouverture ne parse rien et les pages sont
+    partagées entre les workers d'une même machine.
+    """
+
+    def __init__(self, directory):
+        # Lien résolu une seule fois : tous les fichiers viennent de la même version
+        directory = os.path.realpath(directory)
+        with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.directory = directory
+        self.fingerprint = manifest["fingerprint"]
+        self.sections = manifest["sections"]
+        self.chunk_window = manifest["chunk_window"]
+        self.chunk_overlap = manifest["chunk_overlap"]
+        self._documents = RecordBlob(directory, "documents")
+        self.passages = RecordBlob(directory, "passages")
+        self.embedding_texts = TextBlob(directory, "embedding_texts")
+        self.doc_section = np.load(os.path.join(directory, "doc_section.npy"), mmap_mode="r")
+        self.chunk_parent = np.load(os.path.join(directory, "chunk_parent.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __getitem__(self, i):
+        return self._documents[i]
+
+    def section_indices(self, section):
+        if section not in self.sections:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(self.doc_section == self.sections.index(section))
+
+    def documents(self, section=None):
+        if section is None:
+            return list(self)
+        return [self[int(i)] for i in self.section_indices(section)]
+
+
+def build_kb_store(source_dir=KB_SOURCE_DIR, store_dir=KB_STORE_DIR,
+                   chunk_window=CHUNK_WINDOW, chunk_overlap=CHUNK_OVERLAP):
+    """
+    Compile les JSON de `source_dir` dans une nouvelle version de `<store_dir>.versions`,
+    puis publie le lien symbolique `store_dir` vers cette version (voir `publish_version`).
+    """
+    fingerprint = source_fingerprint(source_dir)
+    kb, doc_section, sections = [], [], []
+    for filename in sorted(os.listdir(source_dir)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(source_dir, filename), encoding="utf-8") as f:
+            entries = json.load(f)
+        if not isinstance(entries, list):
+            continue
+        sections.append(filename[:-len(".json")])
+        kb.extend(entries)
+        doc_section.extend([len(sections) - 1] * len(entries))
+    passages = build_passages(kb, get_text_for_embedding, chunk_window, chunk_overlap)
+
+    versions_dir = f"{os.path.abspath(store_dir)}.versions"
+    os.makedirs(versions_dir, exist_ok=True)
+    # Écrite sous un nom `.tmp-` que `prune_versions` ignore, renommée une fois complète
+    version_dir = tempfile.mkdtemp(dir=versions_dir, prefix=f".tmp-{fingerprint[:12]}-")
+    try:
+        write_blob(version_dir, "documents", [json.dumps(doc, ensure_ascii=False) for doc in kb])
+        write_blob(version_dir, "passages", [json.dumps(p, ensure_ascii=False) for p in passages])
+        write_blob(version_dir, "embedding_texts", [normalize_text(get_text_for_embedding(p)) for p in passages])
+        np.save(os.path.join(version_dir, "doc_section.npy"), np.array(doc_section, dtype=np.uint16))
+        np.save(os.path.join(version_dir, "chunk_parent.npy"),
+                np.array([p["parent_id"] for p in passages], dtype=np.int64))
+        with open(os.path.join(version_dir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "store_version": STORE_VERSION,
+                "fingerprint": fingerprint,
+                "sections": sections,
+                "documents": len(kb),
+                "passages": len(passages),
+                "chunk_window": chunk_window,
+                "chunk_overlap": chunk_overlap,
+            }, f, ensure_ascii=False, indent=2)
+        staging, version_dir = version_dir, os.path.join(versions_dir, os.path.basename(version_dir)[len(".tmp-"):])
+        os.rename(staging, version_dir)
+        publish_version(version_dir, store_dir)
+    except BaseException:
+        shutil.rmtree(version_dir, ignore_errors=True)
+        raise
+    prune_versions(store_dir)
+    print(f"[INFO] KB store built: {len(kb)} documents, {len(passages)} passages in {store_dir}")
+    return KBStore(store_dir)
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def publish_version(version_dir, store_dir):
+    """
+    Fait pointer `store_dir` sur `version_dir` par un lien symbolique remplacé
+    atomiquement (`os.replace`) : un lecteur voit l'ancienne version ou la
+    nouvelle, jamais un répertoire absent ou à moitié écrit.
+    """
+    link = f"{store_dir}.tmp-link-{os.getpid()}"
+    try:
+        if os.path.lexists(link):
+            os.remove(link)
+        try:
+            os.symlink(os.path.relpath(version_dir, os.path.dirname(os.path.abspath(store_dir))), link)
+        except (OSError, NotImplementedError):
+            link = None  # Windows sans droit de créer des liens : renommage du répertoire
+        if os.path.isdir(store_dir) and not os.path.islink(store_dir):
+            # Répertoire publié par renommage : mis de côté dans les versions,
+            # ses lecteurs gardent leurs mmap valides
+            os.rename(store_dir, tempfile.mkdtemp(dir=os.path.dirname(version_dir), prefix="legacy-"))
+        if link is None:
+            os.rename(version_dir, store_dir)
+        else:
+            os.replace(link, store_dir)
+    except OSError as e:
+        if link is not None and os.path.lexists(link):
+            os.remove(link)
+        published = read_manifest(store_dir)
+        if published is not None and published == read_manifest(version_dir):
+            logger.info("KB store %s already published by another process", store_dir)
+            shutil.rmtree(version_dir, ignore_errors=True)
+            return
+        logger.error("Cannot publish KB store %s -> %s: %s", version_dir, store_dir, e)
+        raise
+
+
+def prune_versions(store_dir, keep=KEEP_VERSIONS):
+    """Supprime les versions les plus anciennes, jamais celle que `store_dir` désigne."""
+    versions_dir = f"{os.path.abspath(store_dir)}.versions"
+    current = os.path.realpath(store_dir)
+    older = sorted(
+        (entry for entry in os.scandir(versions_dir)
+         if entry.is_dir(follow_symlinks=False) and not entry.name.startswith(".tmp-")
+         and os.path.realpath(entry.path) != current),
+        key=lambda entry: entry.stat(follow_symlinks=False).st_mtime_ns, reverse=True,
+    )
+    for entry in older[keep - 1:]:
+        # Les lecteurs de cette version gardent leurs mmap valides après suppression
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def is_current(store_dir, source_dir, chunk_window, chunk_overlap):
+    manifest = read_manifest(store_dir)
+    if manifest is None:
+        return False
+    return (manifest.get("store_version") == STORE_VERSION
+            and manifest.get("fingerprint") == source_fingerprint(source_dir)
+            and manifest.get("chunk_window") == chunk_window
+            and manifest.get("chunk_overlap") == chunk_overlap)
+
+
+def open_kb_store(source_dir=KB_SOURCE_DIR, store_dir=KB_STORE_DIR,
+                  chunk_window=CHUNK_WINDOW, chunk_overlap=CHUNK_OVERLAP, lock=True):
+    """
+    Ouvre le store, en le recompilant d'abord si les JSON sources ont changé.
+    La compilation se fait sous `build_lock` (`lock=False` si l'appelant le
+    tient déjà) : un worker ne supprime pas le store qu'un autre vient de publier.
+    """
+    if is_current(store_dir, source_dir, chunk_window, chunk_overlap):
+        try:
+            return KBStore(store_dir)
+        except FileNotFoundError:
+            pass  # remplacé entre-temps par un autre worker
+    with build_lock() if lock else nullcontext():
+        if is_current(store_dir, source_dir, chunk_window, chunk_overlap):
+            return KBStore(store_dir)
+        return build_kb_store(source_dir, store_dir, chunk_window, chunk_overlap)
+
+
+# Instance unique par processus
+kb_store = open_kb_store()
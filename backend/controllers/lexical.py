@@ -0,0 +1,88 @@
+import os
+import re
+from array import array
+from collections import Counter
+import numpy as np
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(normalized_text):
+    """Le texte est supposé déjà passé par `normalize_text` (minuscules, sans accents)."""
+    return TOKEN_RE.findall(normalized_text)
+
+
+class BM25Index:
+    """
+    Index inversé BM25 en mémoire.
+
+    Les listes de postings sont stockées en CSR : pour le terme t, les
+    documents sont `doc_ids[offsets[t]:offsets[t + 1]]` (int32) et leurs
+    fréquences `term_freqs[...]` (uint16). Aucun objet Python par posting.
+    """
+
+    def __init__(self, texts, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.vocabulary = {}
+        terms, docs, freqs = array("i"), array("i"), array("H")
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                terms.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                docs.append(doc_id)
+                freqs.append(min(tf, 65535))
+
+        terms = np.frombuffer(terms, dtype=np.int32)
+        order = np.argsort(terms, kind="stable")  # stable : doc_ids croissants par terme
+        terms = terms[order]
+        self.doc_ids = np.frombuffer(docs, dtype=np.int32)[order]
+        self.term_freqs = np.frombuffer(freqs, dtype=np.uint16)[order]
+        self.offsets = np.searchsorted(terms, np.arange(len(self.vocabulary) + 1)).astype(np.int64)
+
+        n_docs = max(len(texts), 1)
+        doc_freqs = np.diff(self.offsets).astype(np.float32)
+        self.idf = np.log1p((n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        avg_length = float(doc_lengths.mean()) if len(texts) else 1.0
+        # Dénominateur BM25 précalculé par document : k1 * (1 - b + b * |d| / avgdl)
+        self.length_norm = (k1 * (1 - b + b * doc_lengths / max(avg_length, 1.0))).astype(np.float32)
+        self.n_docs = len(texts)
+
+    def search(self, normalized_query, top_k=10):
+        """Retourne (doc_ids, scores) triés par score décroissant, scores > 0 uniquement."""
+        term_ids = {self.vocabulary[t] for t in tokenize(normalized_query) if t in self.vocabulary}
+        if not term_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.term_freqs[start:end].astype(np.float32)
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + self.length_norm[docs])
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        order = np.argsort(-scores[candidates], kind="stable")
+        return candidates[order], scores[candidates[order]]
+
+    def memory_bytes(self):
+        return int(self.doc_ids.nbytes + self.term_freqs.nbytes + self.offsets.nbytes
+                   + self.idf.nbytes + self.length_norm.nbytes)
+
+
+def reciprocal_rank_fusion(rankings, weights, k=60):
+    """
+    Fusionne plusieurs classements (listes d'identifiants, meilleur en premier) :
+    score(d) = somme des weight / (k + rang). Retourne les identifiants triés.
+    """
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from email.utils import parsedate_to_datetime
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
+# Surchargeable pour pointer vers un serveur de test local
+MISTRAL_ENDPOINT = os.getenv("MISTRAL_ENDPOINT", "https://api.mistral.ai/v1/chat/completions")
+
+HTTP_TIMEOUT = float(os.getenv("MISTRAL_TIMEOUT", "30"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("MISTRAL_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("MISTRAL_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("MISTRAL_KEEPALIVE_EXPIRY", "30"))
+HTTP2 = os.getenv("MISTRAL_HTTP2", "false").lower() in ("1", "true", "yes")
+
+MAX_RETRIES = int(os.getenv("MISTRAL_MAX_RETRIES", "3"))
+BACKOFF_BASE = float(os.getenv("MISTRAL_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("MISTRAL_BACKOFF_MAX", "8"))
+BREAKER_THRESHOLD = int(os.getenv("MISTRAL_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET = float(os.getenv("MISTRAL_BREAKER_RESET", "30"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Levée quand le disjoncteur est ouvert : l'appel n'est pas tenté."""
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur simple : s'ouvre après `threshold` échecs consécutifs,
+    rejette les appels pendant `reset_timeout` secondes, puis laisse
+    passer un seul appel d'essai (état semi-ouvert).
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        # Jeton de l'appel d'essai en cours (état semi-ouvert), None sinon
+        self._trial = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        """
+        Lève CircuitOpenError si l'appel est refusé. Retourne le jeton de
+        l'appel d'essai en état semi-ouvert, None sinon.
+        """
+        state = self.state
+        if state == "open" or (state == "half-open" and self._trial is not None):
+            raise CircuitOpenError("API Mistral indisponible (disjoncteur ouvert)")
+        if state == "half-open":
+            self._trial = object()
+            return self._trial
+        return None
+
+    def release_trial(self, trial):
+        # Essai interrompu sans verdict (annulation, erreur inattendue) : un autre appel pourra le retenter
+        if trial is not None and self._trial is trial:
+            self._trial = None
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial = None
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial = None
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+def retry_delay(attempt, response=None, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """Délai avant la tentative suivante : Retry-After s'il est fourni, sinon backoff exponentiel avec jitter."""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return min(max(float(retry_after), 0.0), cap)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                return min(max(delay, 0.0), cap)
+            except (TypeError, ValueError):
+                pass
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class MistralClient:
+    """
+    Client HTTP partagé par toute l'application (créé dans le lifespan FastAPI) :
+    pool de connexions keep-alive, HTTP/2 optionnel, retries bornés et disjoncteur.
+    """
+
+    def __init__(self, endpoint=MISTRAL_ENDPOINT, api_key=MISTRAL_API_KEY,
+                 timeout=HTTP_TIMEOUT, max_connections=HTTP_MAX_CONNECTIONS,
+                 max_keepalive=HTTP_MAX_KEEPALIVE, keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+                 http2=HTTP2, max_retries=MAX_RETRIES, breaker=None):
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self._client = None
+
+    async def start(self):
+        if self._client is not None:
+            return
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("Paquet 'h2' absent : HTTP/2 désactivé pour le client Mistral")
+                http2 = False
+        self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits, http2=http2)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def headers(self):
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+        }
+
+    async def chat(self, data):
+        """POST vers l'endpoint chat/completions ; retourne le JSON de la réponse."""
+        await self.start()
+        attempt = 0
+        while True:
+            trial = self.breaker.before_call()
+            response = None
+            try:
+                response = await self._client.post(self.endpoint, headers=self.headers, json=data)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    self.breaker.record_success()
+                    return response.json()
+                error = httpx.HTTPStatusError(
+                    f"Mistral a répondu {response.status_code}", request=response.request, response=response
+                )
+            except httpx.TransportError as e:
+                error = e
+            except httpx.HTTPStatusError:
+                # Erreur client (4xx hors 429) : l'amont fonctionne, inutile de réessayer
+                self.breaker.record_success()
+                raise
+            except BaseException:
+                self.breaker.release_trial(trial)
+                raise
+
+            self.breaker.record_failure()
+            if attempt >= self.max_retries:
+                raise error
+            delay = retry_delay(attempt, response)
+            logger.warning(f"Appel Mistral échoué ({error}), nouvelle tentative dans {delay:.2f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def stream_chat(self, data):
+        """
+        POST en mode `stream: true` ; génère les objets JSON de chaque événement SSE amont.
+        Les retries ne s'appliquent qu'avant le premier octet. Fermer le générateur
+        (déconnexion du client) ferme la réponse et annule la requête amont.
+        """
+        await self.start()
+        attempt = 0
+        while True:
+            trial = self.breaker.before_call()
+            response, streaming = None, False
+            try:
+                headers = {**self.headers, "Accept": "text/event-stream"}
+                async with self._client.stream("POST", self.endpoint, headers=headers,
+                                               json={**data, "stream": True}) as response:
+                    if response.status_code in RETRY_STATUSES:
+                        await response.aread()
+                        error = httpx.HTTPStatusError(
+                            f"Mistral a répondu {response.status_code}", request=response.request, response=response
+                        )
+                    else:
+                        if response.is_error:
+                            await response.aread()
+                            self.breaker.record_success()
+                            response.raise_for_status()
+                        self.breaker.record_success()
+                        streaming = True
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            event = line[len("data:"):].strip()
+                            if event == "[DONE]":
+                                return
+                            yield json.loads(event)
+                        return
+            except httpx.TransportError as e:
+                if streaming:
+                    raise
+                error = e
+            except BaseException:
+                # Annulation (déconnexion du client) ou erreur inattendue pendant l'essai
+                self.breaker.release_trial(trial)
+                raise
+
+            self.breaker.record_failure()
+            if attempt >= self.max_retries:
+                raise error
+            delay = retry_delay(attempt, response)
+            logger.warning(f"Appel Mistral (stream) échoué ({error}), nouvelle tentative dans {delay:.2f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self):
+        return {
+            "endpoint": self.endpoint,
+            "breaker_state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+        }
+
+
+mistral_client = MistralClient()
@@ -1,42 +1,36 @@
 import os
 import json
+import time
 import httpx
 import logging
+from contextlib import aclosing
 from fastapi import HTTPException
 from dotenv import load_dotenv
-from controllers.retrieval import retriever
+from controllers.retrieval import get_retriever, normalize_text
+from controllers.answer_cache import answer_cache
+from controllers.retrieval_service import retrieval_service
+from controllers.mistral_client import mistral_client, CircuitOpenError
+from controllers.context_packer import context_packer, TokenCounter, CONTEXT_CANDIDATES
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
-MISTRAL_ENDPOINT = "https://api.mistral.ai/v1/chat/completions"
 MODEL_NAME = "mistral-small"
 
 
-def load_split_knowledge_base(folder_path="split_knowledge_base"):
-    all_chunks = []
-    try:
-        for filename in os.listdir(folder_path):
-            if filename.endswith(".json"):
-                filepath = os.path.join(folder_path, filename)
-                with open(filepath, "r", encoding="utf-8") as f:
-                    chunks = json.load(f)
-                    if isinstance(chunks, list):
-                        all_chunks.extend(chunks)
-        logger.info(f"Loaded {len(all_chunks)} knowledge chunks from split files.")
-    except Exception as e:
-        logger.error("Error loading split knowledge base: %s", e)
-    return all_chunks
-
-
-KNOWLEDGE_BASE = load_split_knowledge_base()
+def chunk_title(chunk):
+    """Titre du document source : recopié sur chaque passage, ou dans ses métadonnées `parent`."""
+    parent = chunk.get("parent") or {}
+    return (chunk.get("title") or parent.get("title") or parent.get("nom") or "").strip()
 
 
 def format_chunk_content(chunk):
     # Prioritize 'content' field if available and non-empty
     if "content" in chunk and chunk["content"].strip():
-        return chunk["content"]
+        # Les fenêtres après la première n'ont pas de titre dans leur texte : on le préfixe
+        title = chunk_title(chunk)
+        return f"{title}: {chunk['content']}" if title else chunk["content"]
     # Otherwise, compose a summary string from known fields
     parts = []
     if "nom" in chunk:
@@ -58,24 +52,9 @@ def format_chunk_content(chunk):
     return ", ".join(parts)
 
 
-async def generate_course_response(payload):
-    if not MISTRAL_API_KEY:
-        logger.error("Clé API manquante")
-        raise HTTPException(status_code=500, detail="Clé API manquante")
-
-    # Étape 1 : Récupération des chunks pertinents
-    try:
-        logger.info(f"Récupération des chunks pour : {payload.topic}")
-        top_chunks = retriever.retrieve(payload.topic, top_k=5)
-        # Debug: afficher ce qui est récupéré
-        logger.debug(f"Chunks récupérés : {[format_chunk_content(chunk) for chunk in top_chunks]}")
-    except Exception as e:
-        logger.exception("Erreur lors de la récupération des chunks")
-        raise HTTPException(status_code=500, detail="Erreur lors de la récupération du contexte")
-
-    # Étape 2 : Préparation du prompt avec les chunks formatés
+def build_system_prompt(top_chunks):
     context_text = "\n\n".join(f"- {format_chunk_content(chunk)}" for chunk in top_chunks)
-    system_prompt = f"""
+    return f"""
 Tu es un assistant virtuel pour COMAR Assurances, capable de répondre à des questions sur tous les services et produits proposés par COMAR, ainsi que sur des informations générales relatives à l'entreprise.
 
 Quand un utilisateur pose une question :
@@ -96,40 +75,199 @@ Base de connaissances :
 {context_text}
 """
 
+
+def build_request_data(topic, top_chunks, stream=False):
     messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": payload.topic}
+        {"role": "system", "content": build_system_prompt(top_chunks)},
+        {"role": "user", "content": topic}
     ]
-
     data = {
         "model": MODEL_NAME,
         "messages": messages,
         "temperature": 0.7
     }
+    if stream:
+        data["stream"] = True
+    return data
 
-    headers = {
-        "Authorization": f"Bearer {MISTRAL_API_KEY}",
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
+
+def cache_key_for(payload):
+    return f"{payload.language}:{' '.join(normalize_text(payload.topic).split())}"
+
+
+def pack_context(topic, query_emb, chunks, retriever):
+    """Passages à mettre dans le prompt, dans la limite du budget de tokens."""
+    if not chunks:
+        return chunks
+    if context_packer.counter is None:
+        # Comptage des tokens du contexte : tokenizer configuré, sinon celui du modèle d'embedding
+        context_packer.counter = TokenCounter(fallback=getattr(retriever.embed_model, "tokenizer", None))
+    packed, stats = context_packer.pack(
+        topic, query_emb, chunks, retriever.chunk_embeddings(chunks), format_chunk_content
+    )
+    logger.info(
+        f"Contexte : {stats['selected']}/{stats['candidates']} passages, {stats['tokens']} tokens "
+        f"(budget {context_packer.budget}, {stats['saved_tokens']} économisés sur {stats['baseline_tokens']})"
+    )
+    return packed
+
+
+async def retrieve_context(payload, retriever, with_parent=False):
+    """
+    Encode la question et interroge FAISS (hors de la boucle, en micro-batch),
+    puis consulte le cache sémantique et sélectionne les passages du prompt.
+    Tout se fait sur le snapshot `retriever` pris au début de la requête.
+    Retourne (embedding, réponse en cache ou None, chunks).
+    """
+    try:
+        logger.info(f"Récupération des chunks pour : {payload.topic}")
+        query_emb, top_chunks = await retrieval_service.retrieve(
+            payload.topic, top_k=CONTEXT_CANDIDATES, with_parent=with_parent, retriever=retriever
+        )
+        cached = answer_cache.get_similar(query_emb, retriever.version)
+        if cached is not None:
+            logger.info(f"Réponse servie depuis le cache (sémantique) pour : {payload.topic}")
+            return query_emb, cached, []
+        # Debug: afficher ce qui est récupéré
+        logger.debug(f"Chunks récupérés : {[format_chunk_content(chunk) for chunk in top_chunks]}")
+        return query_emb, None, pack_context(payload.topic, query_emb, top_chunks, retriever)
+    except Exception as e:
+        logger.exception("Erreur lors de la récupération des chunks")
+        raise HTTPException(status_code=500, detail="Erreur lors de la récupération du contexte")
+
+
+async def generate_course_response(payload):
+    if not MISTRAL_API_KEY:
+        logger.error("Clé API manquante")
+        raise HTTPException(status_code=500, detail="Clé API manquante")
+
+    # Snapshot de la base utilisé du début à la fin de la requête
+    retriever = get_retriever()
+
+    # Étape 0 : Cache des réponses (question normalisée, puis similarité sémantique)
+    cache_key = cache_key_for(payload)
+    cached = answer_cache.get(cache_key, retriever.version)
+    if cached is not None:
+        logger.info(f"Réponse servie depuis le cache (exact) pour : {payload.topic}")
+        return {"answer": cached, "question": payload.topic, "version": retriever.version}
+
+    # Étape 1 : Récupération des chunks pertinents
+    query_emb, cached, top_chunks = await retrieve_context(payload, retriever)
+    if cached is not None:
+        return {"answer": cached, "question": payload.topic, "version": retriever.version}
+
+    # Étape 2 : Préparation du prompt avec les chunks formatés
+    data = build_request_data(payload.topic, top_chunks)
 
     # Étape 3 : Appel à l'API Mistral
     try:
         logger.info(f"Appel à l'API Mistral avec le modèle {MODEL_NAME}")
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(MISTRAL_ENDPOINT, headers=headers, json=data)
-            response.raise_for_status()
-            result = response.json()
-            logger.debug(f"Réponse brute de l'API : {result}")
-            answer = result["choices"][0]["message"]["content"]
-            return {
-                "answer": answer,
-                "question": payload.topic
-            }
+        result = await mistral_client.chat(data)
+        logger.debug(f"Réponse brute de l'API : {result}")
+        answer = result["choices"][0]["message"]["content"]
+        answer_cache.put(cache_key, query_emb, answer, retriever.version)
+        return {
+            "answer": answer,
+            "question": payload.topic,
+            "version": retriever.version,
+        }
 
+    except CircuitOpenError as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=503, detail=str(e))
     except httpx.HTTPStatusError as e:
         logger.error(f"Erreur HTTP lors de l'appel à Mistral : {e.response.text}")
         raise HTTPException(status_code=e.response.status_code, detail=f"Erreur API Mistral : {e.response.text}")
     except Exception as e:
         logger.exception("Erreur inattendue lors de l'appel à Mistral")
         raise HTTPException(status_code=500, detail=f"Erreur interne : {str(e)}")
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def source_of(chunk):
+    parent = chunk.get("parent", {})
+    return {
+        "chunk_id": chunk.get("chunk_id"),
+        "title": parent.get("title") or parent.get("nom") or chunk.get("title") or chunk.get("nom", ""),
+        "url": parent.get("url") or parent.get("page_url", ""),
+        **({"source": parent["source"], "page": parent.get("page")} if parent.get("source") else {}),
+    }
+
+
+async def stream_course_response(request, payload):
+    """
+    Prépare la réponse en streaming (SSE) de /generate-course/stream.
+
+    Les erreurs détectables avant le premier octet (clé manquante, échec de
+    la récupération) sont levées en HTTPException ; la fonction retourne
+    ensuite un générateur d'événements : `sources`, puis des `delta`, puis
+    `done` (usage, timings, version), ou `error` si l'amont échoue en cours
+    de route ; ainsi que la version du snapshot de la base utilisé.
+    """
+    if not MISTRAL_API_KEY:
+        logger.error("Clé API manquante")
+        raise HTTPException(status_code=500, detail="Clé API manquante")
+
+    started = time.perf_counter()
+    retriever = get_retriever()
+    cache_key = cache_key_for(payload)
+    cached = answer_cache.get(cache_key, retriever.version)
+    query_emb, top_chunks = None, []
+    if cached is None:
+        query_emb, cached, top_chunks = await retrieve_context(payload, retriever, with_parent=True)
+    retrieval_ms = (time.perf_counter() - started) * 1000
+
+    async def events():
+        yield sse_event("sources", [source_of(chunk) for chunk in top_chunks])
+        if cached is not None:
+            yield sse_event("delta", {"content": cached})
+            yield sse_event("done", {"usage": None, "cached": True, "version": retriever.version, "timing": {
+                "retrieval_ms": round(retrieval_ms, 1),
+                "total_ms": round((time.perf_counter() - started) * 1000, 1),
+            }})
+            return
+
+        data = build_request_data(payload.topic, top_chunks, stream=True)
+        answer_parts, usage, first_token_ms = [], None, None
+        try:
+            logger.info(f"Appel à l'API Mistral (stream) avec le modèle {MODEL_NAME}")
+            # aclosing : le générateur amont est fermé dès la sortie du bloc (déconnexion,
+            # erreur), ce qui ferme le flux HTTP Mistral et rend la connexion au pool
+            async with aclosing(mistral_client.stream_chat(data)) as stream:
+                async for chunk in stream:
+                    if await request.is_disconnected():
+                        logger.info("Client déconnecté, arrêt du streaming")
+                        return
+                    usage = chunk.get("usage") or usage
+                    for choice in chunk.get("choices", []):
+                        content = choice.get("delta", {}).get("content")
+                        if content:
+                            if first_token_ms is None:
+                                first_token_ms = (time.perf_counter() - started) * 1000
+                            answer_parts.append(content)
+                            yield sse_event("delta", {"content": content})
+        except CircuitOpenError as e:
+            logger.error(str(e))
+            yield sse_event("error", {"message": str(e), "status": 503})
+            return
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Erreur HTTP lors de l'appel à Mistral : {e.response.text}")
+            yield sse_event("error", {"message": f"Erreur API Mistral : {e.response.text}",
+                                      "status": e.response.status_code})
+            return
+        except Exception as e:
+            logger.exception("Erreur inattendue lors du streaming Mistral")
+            yield sse_event("error", {"message": f"Erreur interne : {str(e)}", "status": 500})
+            return
+
+        answer_cache.put(cache_key, query_emb, "".join(answer_parts), retriever.version)
+        yield sse_event("done", {"usage": usage, "cached": False, "version": retriever.version, "timing": {
+            "retrieval_ms": round(retrieval_ms, 1),
+            "first_token_ms": round(first_token_ms, 1) if first_token_ms is not None else None,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        }})
+
+    return events(), retriever.version
@@ -0,0 +1,112 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, FrozenSet, List
+from models.question import Question
+
+logger = logging.getLogger(__name__)
+DATA_PATH = Path(__file__).resolve().parent.parent / "data" / "questions.json"
+# Minimum delay between two mtime checks of the JSON file
+CHECK_INTERVAL = float(os.getenv("QUESTIONS_CHECK_INTERVAL", "1.0"))
+
+
+class CatalogSnapshot:
+    """Immutable view of questions.json with prebuilt inverted indexes."""
+
+    def __init__(self, questions: List[dict], mtime_ns: int):
+        self.mtime_ns = mtime_ns
+        self.questions = questions
+        self.models = [Question(**q) for q in questions]
+        self.position: Dict[int, int] = {q["id"]: i for i, q in enumerate(questions)}
+
+        branches: Dict[str, List[int]] = {}
+        tags: Dict[str, set] = {}
+        for q in questions:
+            branches.setdefault(q["branch"].lower(), []).append(q["id"])
+            for tag in q["tags"]:
+                tags.setdefault(tag.strip().lower(), set()).add(q["id"])
+        self.branch_index: Dict[str, List[int]] = branches
+        self.tag_index: Dict[str, FrozenSet[int]] = {tag: frozenset(ids) for tag, ids in tags.items()}
+
+
+class QuestionCatalog:
+    """
+    Questions loaded once and reloaded only when the file's mtime changes.
+    A reload builds a new snapshot and swaps the reference, so readers
+    never see a half-built index. If the new file cannot be loaded, the
+    previous snapshot keeps being served until the file is fixed.
+    """
+
+    def __init__(self, path=DATA_PATH, check_interval=CHECK_INTERVAL):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._failed_mtime_ns = None
+
+    def snapshot(self) -> CatalogSnapshot:
+        now = time.monotonic()
+        current = self._snapshot
+        if current is not None and now - self._checked_at < self.check_interval:
+            return current
+        self._checked_at = now
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            # Removed or being replaced: the previous snapshot stays in service
+            if current is None:
+                raise
+            logger.warning("Cannot stat %s, keeping the previous questions: %s", self.path, e)
+            return current
+        if current is not None and mtime_ns in (current.mtime_ns, self._failed_mtime_ns):
+            return current
+        with self._lock:
+            if self._snapshot is None or self._snapshot.mtime_ns != mtime_ns:
+                try:
+                    with open(self.path, encoding="utf-8") as f:
+                        self._snapshot = CatalogSnapshot(json.load(f), mtime_ns)
+                except (OSError, ValueError, TypeError, KeyError) as e:
+                    if self._snapshot is None:
+                        raise
+                    # Keep serving the previous snapshot; retried on the next mtime change
+                    self._failed_mtime_ns = mtime_ns
+                    logger.error("Reload of %s failed, keeping the previous questions: %s", self.path, e)
+            return self._snapshot
+
+    def all(self) -> List[dict]:
+        return self.snapshot().questions
+
+    def by_branch(self, branch_name: str) -> List[dict]:
+        snap = self.snapshot()
+        return [snap.questions[snap.position[i]] for i in snap.branch_index.get(branch_name.lower(), [])]
+
+    @staticmethod
+    def matching_ids(snap: CatalogSnapshot, tags: List[str], match: str = "any") -> List[int]:
+        """
+        Question ids matching `tags`: with match="all" every tag is required;
+        with match="any" questions are ranked by number of matched tags, then file order.
+        """
+        wanted = {tag.strip().lower() for tag in tags if tag.strip()}
+        postings = [snap.tag_index.get(tag, frozenset()) for tag in wanted]
+        if not postings:
+            return []
+        if match == "all":
+            return sorted(frozenset.intersection(*postings), key=snap.position.get)
+        counts = Counter(i for ids in postings for i in ids)
+        return sorted(counts, key=lambda i: (-counts[i], snap.position[i]))
+
+    def search(self, tags: List[str], match: str = "any") -> List[dict]:
+        snap = self.snapshot()
+        return [snap.questions[snap.position[i]] for i in self.matching_ids(snap, tags, match)]
+
+    def search_models(self, tags: List[str], match: str = "any") -> List[Question]:
+        snap = self.snapshot()
+        return [snap.models[snap.position[i]] for i in self.matching_ids(snap, tags, match)]
+
+
+catalog = QuestionCatalog()
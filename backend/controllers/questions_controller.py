@@ -1,16 +1,24 @@
-import json
-from pathlib import Path
-
-DATA_PATH = Path(__file__).resolve().parent.parent / "data" / "questions.json"
+from controllers.question_catalog import catalog
+from controllers.response_cache import response_cache
 
 def load_all_questions():
-    with open(DATA_PATH, encoding="utf-8") as f:
-        return json.load(f)
+    return catalog.all()
 
 def get_questions_by_branch(branch_name: str):
-    questions = load_all_questions()
-    return [q for q in questions if q["branch"].lower() == branch_name.lower()]
+    return catalog.by_branch(branch_name)
 
 def search_questions_by_tag(tag: str):
-    questions = load_all_questions()
-    return [q for q in questions if tag.lower() in [t.lower() for t in q["tags"]]]
+    return catalog.search([tag])
+
+# Pre-serialized payloads, rebuilt only when questions.json changes
+def prepared_all_questions():
+    snap = catalog.snapshot()
+    return response_cache.get("questions:all", snap.mtime_ns,
+                              lambda: [m.model_dump() for m in snap.models])
+
+def prepared_questions_by_branch(branch_name: str):
+    snap = catalog.snapshot()
+    branch = branch_name.lower()
+    return response_cache.get(f"questions:branch:{branch}", snap.mtime_ns, lambda: [
+        snap.models[snap.position[i]].model_dump() for i in snap.branch_index.get(branch, [])
+    ])
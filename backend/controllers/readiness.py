@@ -0,0 +1,72 @@
+import os
+import time
+import asyncio
+import logging
+from fastapi import HTTPException
+from controllers.retrieval import get_retriever
+
+logger = logging.getLogger(__name__)
+
+# Délai conseillé aux clients (en secondes) tant que la récupération n'est pas prête
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "5"))
+
+
+class RetrievalReadiness:
+    """
+    Initialise la pile de récupération (modèle d'embedding, index FAISS, BM25)
+    en tâche de fond au démarrage, pour que le serveur écoute immédiatement.
+
+    Une requête d'échauffement passe par encode + recherche avant de déclarer
+    la récupération prête : la première vraie requête ne paie pas
+    l'initialisation paresseuse de torch et de FAISS.
+    """
+
+    def __init__(self):
+        self.state = "starting"
+        self.error = None
+        self.started_at = None
+        self.ready_at = None
+        self._task = None
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def start(self):
+        if self._task is None:
+            self.started_at = time.monotonic()
+            self._task = asyncio.get_running_loop().create_task(self._load())
+
+    async def _load(self):
+        try:
+            await asyncio.to_thread(self._warm_up)
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            logger.exception("Échec de l'initialisation de la récupération")
+            return
+        self.ready_at = time.monotonic()
+        self.state = "ready"
+        logger.info("Récupération prête en %.1fs", self.ready_at - self.started_at)
+
+    def _warm_up(self):
+        get_retriever().warm_up()
+
+    def require(self):
+        """Dépendance des routes RAG : 503 immédiat avec Retry-After tant que ce n'est pas prêt."""
+        if not self.ready:
+            detail = ("Initialisation de la recherche en cours" if self.state == "starting"
+                      else "Recherche indisponible")
+            raise HTTPException(status_code=503, detail=detail,
+                                headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+    def status(self):
+        status = {"status": self.state}
+        if self.ready:
+            status["startup_seconds"] = round(self.ready_at - self.started_at, 2)
+        if self.error:
+            status["error"] = self.error
+        return status
+
+
+retrieval_readiness = RetrievalReadiness()
@@ -0,0 +1,101 @@
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() in ("1", "true", "yes")
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "20000"))
+
+
+class CrossEncoderReranker:
+    """
+    Second étage optionnel : rescore les candidats du premier étage avec un
+    cross-encoder sur CPU.
+
+    Les paires (requête, passage) sont scorées par batches ; si le budget de
+    temps de la requête est dépassé avant la fin, l'ordre du premier étage
+    est renvoyé tel quel. Les scores déjà calculés sont gardés dans un cache
+    LRU, ce qui accélère aussi la requête suivante.
+    """
+
+    def __init__(self, model_name=RERANK_MODEL, batch_size=RERANK_BATCH_SIZE,
+                 budget_ms=RERANK_BUDGET_MS, cache_size=RERANK_CACHE_SIZE):
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.batch_size = batch_size
+        self.budget = budget_ms / 1000
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.budget_exceeded = 0
+        self.cache_hits = 0
+        self.total_ms = 0.0
+
+    def _cached(self, key):
+        with self._lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+            return score
+
+    def _store(self, key, score):
+        with self._lock:
+            self._cache[key] = score
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def rerank(self, query, candidates, top_k):
+        """
+        `candidates` : liste de (identifiant, texte) dans l'ordre du premier étage.
+        Retourne les `top_k` identifiants réordonnés.
+        """
+        started = time.perf_counter()
+        scores = {}
+        pending = []
+        for candidate_id, text in candidates:
+            score = self._cached((query, candidate_id))
+            if score is None:
+                pending.append((candidate_id, text))
+            else:
+                scores[candidate_id] = score
+
+        for start in range(0, len(pending), self.batch_size):
+            if time.perf_counter() - started > self.budget:
+                self.budget_exceeded += 1
+                break
+            batch = pending[start:start + self.batch_size]
+            batch_scores = self.model.predict([(query, text) for _, text in batch], batch_size=self.batch_size)
+            for (candidate_id, _), score in zip(batch, batch_scores):
+                scores[candidate_id] = float(score)
+                self._store((query, candidate_id), float(score))
+
+        first_stage = [candidate_id for candidate_id, _ in candidates]
+        if all(candidate_id in scores for candidate_id in first_stage):
+            ranking = sorted(first_stage, key=scores.get, reverse=True)
+        else:
+            ranking = first_stage
+        self.calls += 1
+        self.total_ms += (time.perf_counter() - started) * 1000
+        return ranking[:top_k]
+
+    def stats(self):
+        return {
+            "model": self.model_name,
+            "calls": self.calls,
+            "budget_exceeded": self.budget_exceeded,
+            "cache_hits": self.cache_hits,
+            "cache_size": len(self._cache),
+            "avg_ms": self.total_ms / self.calls if self.calls else 0.0,
+        }
@@ -0,0 +1,95 @@
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from fastapi import Request, Response
+
+# Installés par requirements-backend.txt : orjson pour la sérialisation, brotli pour la variante br.
+# Repli sur json / gzip seuls si l'un d'eux manque.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# En dessous de cette taille, la compression ne vaut pas la peine
+MIN_COMPRESS_BYTES = 512
+
+
+def dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    return etag in {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+
+class PreparedResponse:
+    """
+    Payload JSON sérialisé une seule fois et conservé en version brute, gzip
+    et br (si brotli est installé), chacune avec son propre ETag fort.
+    """
+
+    def __init__(self, data, cache_control="public, max-age=60"):
+        self.body = dumps(data)
+        digest = hashlib.sha1(self.body).hexdigest()
+        self.cache_control = cache_control
+        self.variants = {None: (self.body, f'"{digest}"')}
+        if len(self.body) >= MIN_COMPRESS_BYTES:
+            self.variants["gzip"] = (gzip.compress(self.body, compresslevel=9, mtime=0), f'"{digest}-gzip"')
+            if brotli is not None:
+                self.variants["br"] = (brotli.compress(self.body, quality=11), f'"{digest}-br"')
+
+    def _encoding_for(self, accept_encoding: str):
+        accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and encoding in accepted:
+                return encoding
+        return None
+
+    def respond(self, request: Request) -> Response:
+        encoding = self._encoding_for(request.headers.get("accept-encoding", ""))
+        body, etag = self.variants[encoding]
+        headers = {"ETag": etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+        if_none_match = request.headers.get("if-none-match")
+        # Seul l'ETag de la variante qui serait envoyée compte : un client qui a la
+        # version brute ne doit pas recevoir de 304 pour la version gzip
+        if if_none_match and _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+class ResponseCache:
+    """Réponses préparées par clé, reconstruites quand la version des données change (LRU borné)."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version, build) -> PreparedResponse:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+        prepared = PreparedResponse(build())
+        with self._lock:
+            self._entries[key] = (version, prepared)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return prepared
+
+
+response_cache = ResponseCache()
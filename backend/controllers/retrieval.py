@@ -1,108 +1,208 @@
-from sentence_transformers import SentenceTransformer
-import faiss
 import numpy as np
 import os
-import json
-import unicodedata
-import re
-
-def normalize_text(text):
-    text = text.lower()
-    text = ''.join(
-        c for c in unicodedata.normalize('NFD', text)
-        if unicodedata.category(c) != 'Mn'
-    )
-    text = re.sub(r'[^\w\s]', '', text)
-    return text
-
-def get_text_for_embedding(chunk):
+import hashlib
+import threading
+from controllers.text_processing import normalize_text, get_text_for_embedding
+from controllers.chunking import build_passages, parent_metadata, CHUNK_WINDOW, CHUNK_OVERLAP
+from controllers.index_store import sync_index, INDEX_MMAP
+from controllers.kb_store import kb_store
+from controllers.embedding_backend import load_embed_model, embed_model_version, EMBED_BACKEND
+from controllers.index_factory import prepare_vectors, INDEX_TYPE, INDEX_METRIC
+from controllers.lexical import BM25Index, reciprocal_rank_fusion
+from controllers.reranker import CrossEncoderReranker, RERANK_ENABLED, RERANK_CANDIDATES
+
+# Recherche hybride : BM25 + dense fusionnés par Reciprocal Rank Fusion
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+RRF_DENSE_WEIGHT = float(os.getenv("RRF_DENSE_WEIGHT", "1.0"))
+RRF_LEXICAL_WEIGHT = float(os.getenv("RRF_LEXICAL_WEIGHT", "1.0"))
+WARMUP_QUERY = "assurance automobile"
+
+class Retriever:
     """
-    Extraction explicite des champs de ton JSON santé
-    pour que tout soit pris en compte par l'index FAISS.
+    Snapshot de récupération : KB store, index FAISS, embeddings et BM25 d'une
+    même version, jamais modifiés après construction. Une nouvelle version de
+    la base donne un nouveau Retriever (voir `with_store`), publié par
+    `set_retriever` ; les requêtes en cours gardent celui qu'elles ont pris.
     """
-    parts = []
-
-    # Nom et URL
-    if "nom" in chunk:
-        parts.append(f"Nom: {chunk['nom']}")
-    if "url" in chunk:
-        parts.append(f"URL: {chunk['url']}")
-
-    # Sections principales
-    sections = chunk.get("sections", {})
-    if "aperçu" in sections:
-        parts.append(f"Aperçu: {sections['aperçu']}")
-    if "couverture" in sections:
-        parts.append(f"Couverture: {sections['couverture']}")
-    if "plans" in sections:
-        parts.append(f"Plans: {sections['plans']}")
-
-    # Services
-    for service in sections.get("services", []):
-        parts.append(f"Service: {service}")
-
-    # Couverture médicale
-    for item in sections.get("couverture_medicale", []):
-        parts.append(f"Couverture médicale: {item}")
-
-    # Fonctionnalités spéciales
-    for item in sections.get("fonctionnalités_spéciales", []):
-        parts.append(f"Fonctionnalité spéciale: {item}")
-
-    # Contact
-    contact = sections.get("contact", {})
-    for key, value in contact.items():
-        parts.append(f"{key.capitalize()}: {value}")
-
-    # Légal
-    for item in sections.get("légal", []):
-        parts.append(f"Légal: {item}")
-
-    return "\n".join(parts)
-
-# Charger la base de connaissance
-def load_knowledge_base(path="data/split_knowledge_base"):
-    all_chunks = []
-    for filename in os.listdir(path):
-        if filename.endswith(".json"):
-            full_path = os.path.join(path, filename)
-            with open(full_path, encoding="utf-8") as f:
-                chunks = json.load(f)
-                if isinstance(chunks, list):
-                    all_chunks.extend(chunks)
-                    print(f"Loaded {len(chunks)} chunks from {filename}")
-    print(f"Total chunks loaded: {len(all_chunks)}")
-    return all_chunks
-
-KNOWLEDGE_BASE = load_knowledge_base()
 
-class Retriever:
-    def __init__(self, kb=KNOWLEDGE_BASE, embed_model_name="all-MiniLM-L6-v2",
-                 index_file="faiss.index", emb_file="embeddings.npy"):
-        self.kb = kb
-        self.embed_model = SentenceTransformer(embed_model_name)
+    def __init__(self, store=kb_store, embed_model_name="all-MiniLM-L6-v2",
+                 index_file="faiss.index", emb_file="embeddings.npy",
+                 manifest_file="index_manifest.json",
+                 chunk_window=CHUNK_WINDOW, chunk_overlap=CHUNK_OVERLAP,
+                 hybrid=HYBRID_SEARCH, dense_weight=RRF_DENSE_WEIGHT, lexical_weight=RRF_LEXICAL_WEIGHT,
+                 rerank=RERANK_ENABLED, index_type=INDEX_TYPE, metric=INDEX_METRIC, mmap=INDEX_MMAP,
+                 embed_model=None, reranker=None, embed_backend=EMBED_BACKEND):
+        self.store = store
+        self.kb = store
+        # Un vecteur par passage ; chunk_parents[i] donne le document source du passage i.
+        # Les passages précompilés du store sont réutilisés quand le découpage est le même.
+        if (chunk_window, chunk_overlap) == (store.chunk_window, store.chunk_overlap):
+            self.chunks = store.passages
+            self.chunk_parents = np.asarray(store.chunk_parent)
+            texts = list(store.embedding_texts)
+        else:
+            self.chunks = build_passages(list(store), get_text_for_embedding, chunk_window, chunk_overlap)
+            self.chunk_parents = np.array([c["parent_id"] for c in self.chunks], dtype=np.int64)
+            texts = [normalize_text(get_text_for_embedding(chunk)) for chunk in self.chunks]
+        # Un modèle déjà chargé (snapshot précédent) est réutilisé tel quel. Chargement
+        # différé : torch n'est importé qu'ici, et seulement pour le backend torch
+        self.embed_model = embed_model or load_embed_model(embed_model_name, embed_backend)
+        self.embed_model_name = embed_model_name
+        self.embed_backend = embed_backend
+        self.chunk_window = chunk_window
+        self.chunk_overlap = chunk_overlap
+        self.mmap = mmap
         self.index_file = index_file
         self.emb_file = emb_file
-
-        if os.path.exists(index_file) and os.path.exists(emb_file):
-            print("[INFO] Loading existing FAISS index and embeddings...")
-            self.index = faiss.read_index(index_file)
-            self.embeddings = np.load(emb_file)
-        else:
-            print("[INFO] Creating embeddings and FAISS index from knowledge base...")
-            texts = [normalize_text(get_text_for_embedding(chunk)) for chunk in kb]
-            self.embeddings = self.embed_model.encode(texts, convert_to_numpy=True)
-            self.index = faiss.IndexFlatL2(self.embeddings.shape[1])
-            self.index.add(self.embeddings)
-            faiss.write_index(self.index, index_file)
-            np.save(emb_file, self.embeddings)
-            print("[INFO] FAISS index and embeddings saved.")
-
-    def retrieve(self, query, top_k=5):
-        query_emb = self.embed_model.encode([normalize_text(query)], convert_to_numpy=True)
-        distances, indices = self.index.search(query_emb, top_k)
-        results = [self.kb[i] for i in indices[0]]
-        return results
-
-# Instance globale
-retriever = Retriever()
+        self.manifest_file = manifest_file
+        print(f"[INFO] {len(self.chunks)} passages over {len(store)} documents.")
+
+        # Index incrémental : seuls les passages nouveaux ou modifiés sont encodés
+        self.index, self.embeddings, self.chunk_ids, self.chunk_rows, self.index_version = sync_index(
+            texts,
+            lambda batch: self.embed_model.encode(batch, convert_to_numpy=True),
+            model_name=embed_model_name,
+            model_version=embed_model_version(self.embed_model),
+            index_file=index_file,
+            emb_file=emb_file,
+            manifest_file=manifest_file,
+            index_type=index_type,
+            metric=metric,
+            mmap=mmap,
+        )
+        self.index_type = index_type
+        self.metric = metric
+        # Version du snapshot : index (textes + modèle) et documents du store (métadonnées)
+        self.version = hashlib.sha1(f"{self.index_version}:{store.fingerprint}".encode("utf-8")).hexdigest()[:12]
+        # Identifiant FAISS -> premier passage portant ce texte
+        self.id_to_chunk = {}
+        for position, chunk_id in enumerate(self.chunk_ids.tolist()):
+            self.id_to_chunk.setdefault(chunk_id, position)
+
+        # Index lexical construit sur les mêmes textes normalisés que les embeddings
+        self.lexical = BM25Index(texts) if hybrid else None
+        self.dense_weight = dense_weight
+        self.lexical_weight = lexical_weight
+        self.reranker = reranker if reranker is not None else (CrossEncoderReranker() if rerank else None)
+
+    def with_store(self, store):
+        """Nouveau snapshot sur `store`, avec les mêmes réglages et les modèles déjà chargés."""
+        return Retriever(
+            store=store, embed_model_name=self.embed_model_name,
+            index_file=self.index_file, emb_file=self.emb_file, manifest_file=self.manifest_file,
+            chunk_window=self.chunk_window, chunk_overlap=self.chunk_overlap,
+            hybrid=self.lexical is not None, dense_weight=self.dense_weight, lexical_weight=self.lexical_weight,
+            rerank=self.reranker is not None, index_type=self.index_type, metric=self.metric, mmap=self.mmap,
+            embed_model=self.embed_model, reranker=self.reranker, embed_backend=self.embed_backend,
+        )
+
+    def warm_up(self):
+        """Une requête complète (encode + recherche) pour initialiser torch et FAISS."""
+        self.search(self.encode_query(WARMUP_QUERY), top_k=1, query=WARMUP_QUERY)
+
+    def parent(self, chunk):
+        return self.kb[chunk["parent_id"]]
+
+    def retrieve(self, query, top_k=5, with_parent=False):
+        """
+        Retourne les `top_k` passages les plus proches de la requête.
+        Avec `with_parent=True`, chaque passage porte aussi les métadonnées
+        (titre, URL...) de son document source sous la clé `parent`.
+        """
+        return self.search(self.encode_query(query), top_k=top_k, with_parent=with_parent, query=query)
+
+    def encode_query(self, query):
+        return self.encode_queries([query])
+
+    def encode_queries(self, queries):
+        return self.embed_model.encode([normalize_text(q) for q in queries], convert_to_numpy=True)
+
+    def search(self, query_emb, top_k=5, with_parent=False, query=None):
+        queries = [query] if query is not None else None
+        return self.search_batch(query_emb, top_k=top_k, with_parent=with_parent, queries=queries)[0]
+
+    def search_batch(self, query_embs, top_k=5, with_parent=False, queries=None):
+        """Un seul appel FAISS pour plusieurs requêtes ; une liste de passages par requête."""
+        return [
+            [self.passage(position, with_parent) for position in positions]
+            for positions in self.rank_batch(query_embs, top_k=top_k, queries=queries)
+        ]
+
+    def rank_batch(self, query_embs, top_k=5, queries=None):
+        """
+        Classement des passages (positions dans `self.chunks`) pour chaque requête.
+        Si le reranker est actif, le premier étage sur-échantillonne `RERANK_CANDIDATES`
+        passages que le cross-encoder réordonne.
+        """
+        if self.reranker is None or queries is None:
+            return self.first_stage_batch(query_embs, top_k=top_k, queries=queries)
+        n_candidates = max(top_k, RERANK_CANDIDATES)
+        rankings = []
+        for query, candidates in zip(queries, self.first_stage_batch(query_embs, n_candidates, queries)):
+            reranked = self.reranker.rerank(
+                query,
+                [(int(self.chunk_ids[p]), get_text_for_embedding(self.chunks[p])) for p in candidates],
+                top_k,
+            )
+            rankings.append([self.id_to_chunk[chunk_id] for chunk_id in reranked])
+        return rankings
+
+    def first_stage_batch(self, query_embs, top_k=5, queries=None):
+        """
+        Premier étage : FAISS, fusionné avec BM25 quand le texte de la requête est connu.
+        Sans texte de requête ou sans index lexical, seul l'ordre FAISS est utilisé.
+        """
+        hybrid = self.lexical is not None and queries is not None
+        n_candidates = max(top_k, HYBRID_CANDIDATES) if hybrid else top_k
+        distances, indices = self.index.search(prepare_vectors(query_embs, self.metric), n_candidates)
+        dense = [[self.id_to_chunk[int(i)] for i in row if i >= 0] for row in indices]
+        if not hybrid:
+            return [ranking[:top_k] for ranking in dense]
+
+        rankings = []
+        for query, dense_ranking in zip(queries, dense):
+            lexical_ranking, _ = self.lexical.search(normalize_text(query), n_candidates)
+            fused = reciprocal_rank_fusion(
+                [dense_ranking, lexical_ranking.tolist()],
+                [self.dense_weight, self.lexical_weight],
+                k=RRF_K,
+            )
+            rankings.append(fused[:top_k])
+        return rankings
+
+    def chunk_embeddings(self, chunks):
+        """Embeddings des passages donnés (clé `chunk_id`), dans le même ordre."""
+        return self.embeddings[self.chunk_rows[[chunk["chunk_id"] for chunk in chunks]]]
+
+    def passage(self, position, with_parent=False):
+        chunk = self.chunks[position]
+        if with_parent:
+            chunk = {**chunk, "parent": parent_metadata(self.parent(chunk))}
+        return chunk
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+
+def get_retriever():
+    """Instance partagée, construite au premier appel (modèle, index FAISS, BM25)."""
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                _retriever = Retriever()
+    return _retriever
+
+
+def current_retriever():
+    """Instance partagée si elle est déjà construite, sinon None (sans la construire)."""
+    return _retriever
+
+
+def set_retriever(retriever):
+    """Publie un nouveau snapshot ; les requêtes suivantes l'utiliseront."""
+    global _retriever
+    with _retriever_lock:
+        _retriever = retriever
@@ -0,0 +1,123 @@
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from controllers.retrieval import get_retriever
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_MAX_BATCH = int(os.getenv("RETRIEVAL_MAX_BATCH", "16"))
+RETRIEVAL_MAX_WAIT_MS = float(os.getenv("RETRIEVAL_MAX_WAIT_MS", "5"))
+
+
+class RetrievalService:
+    """
+    Façade asynchrone du Retriever.
+
+    Les requêtes concurrentes sont regroupées en micro-batches (au plus
+    `max_batch_size` requêtes, ou ce qui est arrivé en `max_wait_ms`) ;
+    chaque batch fait un seul `encode` + `index.search` dans un thread
+    dédié, ce qui laisse la boucle d'événements libre pour les autres routes.
+    """
+
+    def __init__(self, retriever=None, max_batch_size=RETRIEVAL_MAX_BATCH, max_wait_ms=RETRIEVAL_MAX_WAIT_MS):
+        self._retriever = retriever
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        # Un seul thread : les batches s'enchaînent, torch/faiss parallélisent déjà en interne
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retrieval")
+        self._queue = None
+        self._worker = None
+        self._loop = None
+        self.batches = 0
+        self.queries = 0
+
+    @property
+    def retriever(self):
+        # Sans instance fournie, le snapshot courant est résolu à chaque requête
+        return self._retriever or get_retriever()
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def retrieve(self, query, top_k=5, with_parent=False, retriever=None):
+        """
+        Retourne (embedding de la requête, passages) sans bloquer la boucle.
+        `retriever` fixe le snapshot interrogé (par défaut, le snapshot courant).
+        """
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((query, top_k, with_parent, retriever or self.retriever, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [item for item in batch if not item[-1].cancelled()]
+            if not batch:
+                continue
+            try:
+                results = await self._loop.run_in_executor(self._executor, self._process, batch)
+            except Exception as e:
+                logger.exception("Erreur lors d'un batch de récupération")
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (*_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def _process(self, batch):
+        # Pendant un changement de snapshot, un batch peut viser deux versions :
+        # chaque groupe est traité avec son propre Retriever
+        groups = {}
+        for i, item in enumerate(batch):
+            groups.setdefault(id(item[3]), []).append(i)
+        results = [None] * len(batch)
+        for positions in groups.values():
+            retriever = batch[positions[0]][3]
+            queries = [batch[i][0] for i in positions]
+            top_k = max(batch[i][1] for i in positions)
+            with_parent = any(batch[i][2] for i in positions)
+            embeddings = retriever.encode_queries(queries)
+            passages = retriever.search_batch(embeddings, top_k=top_k, with_parent=with_parent, queries=queries)
+            for j, i in enumerate(positions):
+                results[i] = (embeddings[j:j + 1], passages[j][:batch[i][1]])
+        self.batches += 1
+        self.queries += len(batch)
+        return results
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch_size": self.queries / self.batches if self.batches else 0.0,
+        }
+
+
+retrieval_service = RetrievalService()
@@ -0,0 +1,130 @@
+import os
+import time
+import asyncio
+import logging
+from controllers.kb_store import open_kb_store, source_fingerprint, build_lock, KB_SOURCE_DIR, KB_STORE_DIR
+from controllers.retrieval import get_retriever, current_retriever, set_retriever
+from controllers.answer_cache import answer_cache
+
+logger = logging.getLogger(__name__)
+
+# Intervalle (secondes) de surveillance des JSON sources ; 0 désactive la surveillance
+SNAPSHOT_WATCH_INTERVAL = float(os.getenv("SNAPSHOT_WATCH_INTERVAL", "30"))
+
+
+class SnapshotManager:
+    """
+    Remplacement à chaud du snapshot de récupération (KB store + index + embeddings).
+
+    Le nouveau snapshot est construit dans un thread, à côté de celui en
+    service, en réutilisant le modèle d'embedding déjà chargé ; il est
+    échauffé puis publié d'un seul coup. Les requêtes en cours terminent sur
+    l'ancien snapshot, qu'elles ont pris au début, et le cache des réponses
+    passe à la nouvelle version.
+
+    Déclencheurs : `reload()` (endpoint d'administration) et, tous les
+    `watch_interval` secondes, un changement de l'empreinte des JSON sources,
+    ce qui propage aussi le rechargement aux autres workers.
+    """
+
+    def __init__(self, source_dir=KB_SOURCE_DIR, store_dir=KB_STORE_DIR, watch_interval=SNAPSHOT_WATCH_INTERVAL):
+        self.source_dir = source_dir
+        self.store_dir = store_dir
+        self.watch_interval = watch_interval
+        self.state = "idle"
+        self.error = None
+        self.swaps = 0
+        self.last_swap_at = None
+        self.last_build_seconds = None
+        self._task = None
+        self._watcher = None
+
+    @property
+    def building(self):
+        return self._task is not None and not self._task.done()
+
+    def reload(self, force=False):
+        """
+        Lance la construction d'un nouveau snapshot en tâche de fond, sauf si
+        une construction est déjà en cours. Sans `force`, rien n'est remplacé
+        si les JSON sources n'ont pas changé.
+        """
+        if not self.building:
+            self.state = "building"
+            self.error = None
+            self._task = asyncio.get_running_loop().create_task(self._rebuild(force))
+        return self.status()
+
+    async def _rebuild(self, force):
+        started = time.monotonic()
+        try:
+            await asyncio.to_thread(self._build, force)
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            logger.exception("Échec de la construction du snapshot")
+            return
+        self.last_build_seconds = round(time.monotonic() - started, 2)
+        self.state = "idle"
+
+    def _build(self, force):
+        current = get_retriever()
+        with build_lock():
+            store = open_kb_store(self.source_dir, self.store_dir, current.chunk_window, current.chunk_overlap,
+                                  lock=False)
+            if not force and store.fingerprint == current.store.fingerprint:
+                logger.info("Base inchangée, snapshot %s conservé", current.version)
+                return
+            snapshot = current.with_store(store)
+        snapshot.warm_up()
+        set_retriever(snapshot)
+        answer_cache.set_version(snapshot.version)
+        self.swaps += 1
+        self.last_swap_at = time.time()
+        logger.info("Snapshot %s publié (remplace %s)", snapshot.version, current.version)
+
+    def start_watching(self):
+        if self.watch_interval > 0 and self._watcher is None:
+            self._watcher = asyncio.get_running_loop().create_task(self._watch())
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            current = current_retriever()
+            if current is None or self.building:
+                continue
+            try:
+                fingerprint = await asyncio.to_thread(source_fingerprint, self.source_dir)
+            except OSError as e:
+                logger.warning("Surveillance de %s impossible : %s", self.source_dir, e)
+                continue
+            if fingerprint != current.store.fingerprint:
+                logger.info("Changement détecté dans %s, construction d'un nouveau snapshot", self.source_dir)
+                self.reload()
+
+    async def close(self):
+        for task in (self._watcher, self._task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._watcher = None
+
+    def status(self):
+        current = current_retriever()
+        return {
+            "version": current.version if current else None,
+            "state": self.state,
+            "error": self.error,
+            "swaps": self.swaps,
+            "last_swap_at": self.last_swap_at,
+            "last_build_seconds": self.last_build_seconds,
+            "documents": len(current.store) if current else None,
+            "passages": len(current.chunks) if current else None,
+            "watch_interval": self.watch_interval,
+        }
+
+
+snapshot_manager = SnapshotManager()
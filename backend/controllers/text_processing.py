@@ -0,0 +1,67 @@
+import unicodedata
+import re
+
+def normalize_text(text):
+    text = text.lower()
+    text = ''.join(
+        c for c in unicodedata.normalize('NFD', text)
+        if unicodedata.category(c) != 'Mn'
+    )
+    text = re.sub(r'[^\w\s]', '', text)
+    return text
+
+def get_text_for_embedding(chunk):
+    """
+    Extraction explicite des champs de ton JSON santé
+    pour que tout soit pris en compte par l'index FAISS.
+    """
+    parts = []
+
+    # Passages issus des pages scrapées
+    if chunk.get("title"):
+        parts.append(f"Titre: {chunk['title']}")
+    if chunk.get("content"):
+        parts.append(chunk["content"])
+
+    # Nom et URL
+    if "nom" in chunk:
+        parts.append(f"Nom: {chunk['nom']}")
+    if "url" in chunk:
+        parts.append(f"URL: {chunk['url']}")
+
+    # Fiches agences
+    for key in ("type", "gouvernorat", "adresse", "telephone", "code_agence"):
+        if chunk.get(key):
+            parts.append(f"{key.replace('_', ' ').capitalize()}: {chunk[key]}")
+
+    # Sections principales
+    sections = chunk.get("sections", {})
+    if "aperçu" in sections:
+        parts.append(f"Aperçu: {sections['aperçu']}")
+    if "couverture" in sections:
+        parts.append(f"Couverture: {sections['couverture']}")
+    if "plans" in sections:
+        parts.append(f"Plans: {sections['plans']}")
+
+    # Services
+    for service in sections.get("services", []):
+        parts.append(f"Service: {service}")
+
+    # Couverture médicale
+    for item in sections.get("couverture_medicale", []):
+        parts.append(f"Couverture médicale: {item}")
+
+    # Fonctionnalités spéciales
+    for item in sections.get("fonctionnalités_spéciales", []):
+        parts.append(f"Fonctionnalité spéciale: {item}")
+
+    # Contact
+    contact = sections.get("contact", {})
+    for key, value in contact.items():
+        parts.append(f"{key.capitalize()}: {value}")
+
+    # Légal
+    for item in sections.get("légal", []):
+        parts.append(f"Légal: {item}")
+
+    return "\n".join(parts)
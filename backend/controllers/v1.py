@@ -1,39 +1,28 @@
 import os
-import json
 import httpx
 import logging
 from fastapi import HTTPException
 from dotenv import load_dotenv
+from controllers.mistral_client import mistral_client, CircuitOpenError
+from controllers.retrieval import get_retriever
+from controllers.retrieval_service import retrieval_service
+from controllers.context_packer import CONTEXT_CANDIDATES
+from controllers.mistral_controller import pack_context
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
-MISTRAL_ENDPOINT = "https://api.mistral.ai/v1/chat/completions"
 MODEL_NAME = "mistral-small"
 
-def load_split_knowledge_base(folder_path="split_knowledge_base"):
-    all_chunks = []
-    try:
-        for filename in os.listdir(folder_path):
-            if filename.endswith(".json"):
-                filepath = os.path.join(folder_path, filename)
-                with open(filepath, "r", encoding="utf-8") as f:
-                    chunks = json.load(f)
-                    if isinstance(chunks, list):
-                        all_chunks.extend(chunks)
-        logger.info(f"Loaded {len(all_chunks)} knowledge chunks from split files.")
-    except Exception as e:
-        logger.error("Error loading split knowledge base: %s", e)
-    return all_chunks
-
-KNOWLEDGE_BASE = load_split_knowledge_base()
-
 async def generate_course_response(payload):
     if not MISTRAL_API_KEY:
         raise HTTPException(status_code=500, detail="Missing API key")
 
-    context_chunks = KNOWLEDGE_BASE
+    # Passages pertinents dans le budget de tokens, pas toute la base (plus d'un million de caractères)
+    retriever = get_retriever()
+    query_emb, candidates = await retrieval_service.retrieve(payload.topic, top_k=CONTEXT_CANDIDATES, retriever=retriever)
+    context_chunks = pack_context(payload.topic, query_emb, candidates, retriever)
     context_text = "\n\n".join(
         f"- {item.get('title', '').strip()}\n{item.get('content', '').strip()}"
         for item in context_chunks
@@ -66,12 +55,6 @@ Base de connaissances :
         }
     ]
 
-    headers = {
-        "Authorization": f"Bearer {MISTRAL_API_KEY}",
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
-
     data = {
         "model": MODEL_NAME,
         "messages": messages,
@@ -79,15 +62,14 @@ Base de connaissances :
     }
 
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(MISTRAL_ENDPOINT, headers=headers, json=data)
-            response.raise_for_status()
-            result = response.json()
-            return {
-                "answer": result["choices"][0]["message"]["content"],
-                "question": payload.topic
-            }
+        result = await mistral_client.chat(data)
+        return {
+            "answer": result["choices"][0]["message"]["content"],
+            "question": payload.topic
+        }
 
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except httpx.HTTPStatusError as e:
         raise HTTPException(status_code=e.response.status_code, detail=f"API Error: {e.response.text}")
     except Exception as e:
@@ -0,0 +1,360 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urldefrag, urljoin, urlparse
+import httpx
+from scrapper import (BASE_URL, OUTPUT_DIR, HEADERS, parse_page, classify_section, save_content, ensure_dirs,
+                      extract_pdf_text)
+
+# Total simultaneous requests, and per host
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "8"))
+CRAWL_PER_HOST = int(os.getenv("CRAWL_PER_HOST", "2"))
+# Minimum delay between two requests to the same host (seconds)
+CRAWL_DELAY = float(os.getenv("CRAWL_DELAY", "0.5"))
+CRAWL_TIMEOUT = float(os.getenv("CRAWL_TIMEOUT", "15"))
+# URLs waiting in the frontier; discoveries beyond this are dropped for this run
+CRAWL_MAX_FRONTIER = int(os.getenv("CRAWL_MAX_FRONTIER", "5000"))
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "5000"))
+# Save the crawl state every N fetched URLs so an interrupted run can resume
+CHECKPOINT_EVERY = 25
+MAX_ATTEMPTS = 3
+
+STATE_FILE = "crawl_state.json"
+MANIFEST_FILE = "changed_pages.json"
+STATE_VERSION = 1
+
+
+def write_json(path, data):
+    """Write to a temporary file in the same folder, then rename it over `path`."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def content_hash(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha1(data).hexdigest()
+
+
+def canonical_url(url):
+    url, _ = urldefrag(url)
+    parsed = urlparse(url)
+    return parsed._replace(netloc=parsed.netloc.lower(), path=parsed.path or "/").geturl()
+
+
+def retry_after_seconds(value, default):
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class HostLimiter:
+    """Caps concurrent requests to one host and spaces them by at least `delay` seconds."""
+
+    def __init__(self, concurrency, delay):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.delay = delay
+        self.next_at = 0.0
+        self.lock = asyncio.Lock()
+
+    def backoff(self, seconds):
+        self.next_at = max(self.next_at, time.monotonic() + seconds)
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        async with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_at)
+            self.next_at = start + self.delay
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def __aexit__(self, *exc):
+        self.semaphore.release()
+
+
+class Crawler:
+    """
+    Breadth-first asyncio crawler of one site.
+
+    The frontier is a bounded queue served by a fixed pool of workers, with
+    per-host concurrency and delay limits. Everything known about a page
+    (validators, content hash, outgoing links) lives in the crawl state
+    file, so the next run sends conditional GETs and an interrupted run
+    resumes from its saved frontier. Each completed run writes a manifest
+    of added, changed and removed pages for the KB rebuild.
+    """
+
+    def __init__(self, base_url=BASE_URL, output_dir=OUTPUT_DIR, concurrency=CRAWL_CONCURRENCY,
+                 per_host=CRAWL_PER_HOST, delay=CRAWL_DELAY, max_frontier=CRAWL_MAX_FRONTIER,
+                 max_pages=CRAWL_MAX_PAGES, timeout=CRAWL_TIMEOUT, fresh=False):
+        self.base_url = canonical_url(base_url)
+        self.output_dir = output_dir
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.delay = delay
+        self.max_frontier = max_frontier
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.hosts = {urlparse(self.base_url).netloc}
+        self.state_path = os.path.join(output_dir, STATE_FILE)
+        self.manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+
+        state = self.load_state()
+        self.pages = state.get("pages", {})
+        run = state.get("run")
+        self.resumed = bool(run) and not run.get("complete") and not fresh
+        if not self.resumed:
+            run = {"started_at": time.time(), "complete": False, "frontier": [self.base_url],
+                   "visited": [], "added": [], "changed": [], "gone": [], "truncated": False}
+        self.run_state = run
+
+    def load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if state.get("state_version") != STATE_VERSION or state.get("base_url") != self.base_url:
+            return {}
+        return state
+
+    def save_state(self):
+        self.run_state["frontier"] = list(self.pending)
+        self.run_state["visited"] = [url for url in self.seen if url not in self.pending]
+        write_json(self.state_path, {
+            "state_version": STATE_VERSION,
+            "base_url": self.base_url,
+            "run": self.run_state,
+            "pages": self.pages,
+        })
+
+    def in_scope(self, url):
+        parsed = urlparse(url)
+        return parsed.scheme in ("http", "https") and parsed.netloc in self.hosts
+
+    def enqueue(self, url, attempt=0):
+        url = canonical_url(url)
+        if url in self.seen or not self.in_scope(url):
+            return
+        if len(self.seen) >= self.max_pages or self.queue.qsize() >= self.max_frontier:
+            self.run_state["truncated"] = True
+            self.stats["dropped"] += 1
+            return
+        self.seen.add(url)
+        self.pending[url] = None
+        self.queue.put_nowait((url, attempt))
+
+    def limiter(self, url):
+        host = urlparse(url).netloc
+        if host not in self.limiters:
+            self.limiters[host] = HostLimiter(self.per_host, self.delay)
+        return self.limiters[host]
+
+    def record_change(self, url, previous):
+        kind = "changed" if previous else "added"
+        if url not in self.run_state[kind]:
+            self.run_state[kind].append(url)
+        self.stats[kind] += 1
+
+    async def fetch(self, url, attempt):
+        """Fetch and store one URL; returns True when it was put back in the queue for a retry."""
+        previous = self.pages.get(url)
+        headers = {}
+        if previous and previous.get("etag"):
+            headers["If-None-Match"] = previous["etag"]
+        if previous and previous.get("last_modified"):
+            headers["If-Modified-Since"] = previous["last_modified"]
+
+        limiter = self.limiter(url)
+        async with limiter:
+            response = await self.client.get(url, headers=headers)
+
+        if response.status_code in (429, 503) and attempt + 1 < MAX_ATTEMPTS:
+            limiter.backoff(retry_after_seconds(response.headers.get("Retry-After"), self.delay * 4))
+            self.queue.put_nowait((url, attempt + 1))
+            return True
+        if response.status_code == 304 and previous:
+            self.stats["not_modified"] += 1
+            for link in previous.get("links", []):
+                self.enqueue(link)
+            return False
+        if response.status_code in (404, 410) and previous:
+            self.run_state["gone"].append(url)
+            return False
+        if response.status_code != 200:
+            self.stats["errors"] += 1
+            print(f"⚠️ {response.status_code} for {url}")
+            return False
+
+        validators = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+        }
+        if "application/pdf" in response.headers.get("Content-Type", "") or url.lower().endswith(".pdf"):
+            await self.store_pdf(url, response.content, previous, validators)
+        else:
+            self.store_page(url, str(response.url), response.content, previous, validators)
+        return False
+
+    def store_page(self, url, final_url, html, previous, validators):
+        title, content, soup = parse_page(html)
+        links = sorted({canonical_url(urljoin(final_url, a["href"])) for a in soup.find_all("a", href=True)})
+        links = [link for link in links if self.in_scope(link)]
+        for link in links:
+            self.enqueue(link)
+        if not content:
+            self.pages[url] = {**validators, "kind": "page", "hash": None, "links": links}
+            return
+
+        digest = content_hash(content)
+        record = {**validators, "kind": "page", "hash": digest, "links": links, "title": title}
+        if previous and previous.get("hash") == digest:
+            self.pages[url] = {**previous, **record}
+            self.stats["unchanged"] += 1
+            return
+        section = classify_section(url, title)
+        record["section"] = section
+        record["file"] = save_content(section, title, url, content, output_dir=self.output_dir)
+        self.pages[url] = record
+        self.record_change(url, previous)
+
+    async def store_pdf(self, url, data, previous, validators):
+        digest = content_hash(data)
+        record = {**validators, "kind": "pdf", "hash": digest, "links": []}
+        if previous and previous.get("hash") == digest:
+            self.pages[url] = {**previous, **record}
+            self.stats["unchanged"] += 1
+            return
+        filename = os.path.basename(urlparse(url).path) or f"{digest[:12]}.pdf"
+        section = classify_section(url, filename)
+        path = os.path.join(self.output_dir, section, "pdfs", filename)
+        with open(path, "wb") as f:
+            f.write(data)
+        # The KB builders only read .txt files: the extracted text goes next to the PDF
+        text = await asyncio.to_thread(extract_pdf_text, path)
+        txt_path = os.path.splitext(path)[0] + ".txt"
+        if text:
+            with open(txt_path, "w", encoding="utf-8") as f:
+                f.write(text)
+        elif os.path.exists(txt_path):
+            os.remove(txt_path)
+        self.pages[url] = {**record, "section": section, "file": txt_path if text else path,
+                           "pdf": path, "title": filename}
+        self.record_change(url, previous)
+
+    async def worker(self):
+        while True:
+            url, attempt = await self.queue.get()
+            retried = False
+            try:
+                retried = await self.fetch(url, attempt)
+            except httpx.HTTPError as e:
+                self.stats["errors"] += 1
+                print(f"❌ Failed to fetch {url}: {e}")
+            except Exception as e:
+                # Parse or write error: the worker must survive, or queue.join() never returns
+                self.stats["errors"] += 1
+                print(f"❌ Failed to process {url}: {e!r}")
+            finally:
+                if not retried:
+                    self.pending.pop(url, None)
+                self.stats["fetched"] += 1
+                if self.stats["fetched"] % CHECKPOINT_EVERY == 0:
+                    self.save_state()
+                self.queue.task_done()
+
+    def manifest_entry(self, url):
+        page = self.pages[url]
+        return {"url": url, **{key: page.get(key) for key in ("kind", "section", "title", "file", "hash")}}
+
+    def build_manifest(self):
+        visited = set(self.run_state["visited"])
+        # 404/410 pages are gone; unvisited ones only when the whole site was walked
+        removed = set(self.run_state["gone"]) & set(self.pages)
+        if not self.run_state["truncated"]:
+            removed |= set(self.pages) - visited
+        removed = sorted(removed)
+        return {
+            "base_url": self.base_url,
+            "started_at": self.run_state["started_at"],
+            "finished_at": time.time(),
+            "truncated": self.run_state["truncated"],
+            "added": [self.manifest_entry(url) for url in self.run_state["added"] if url in self.pages],
+            "changed": [self.manifest_entry(url) for url in self.run_state["changed"] if url in self.pages],
+            "removed": [{"url": url, "file": self.pages[url].get("file")} for url in removed],
+            "stats": self.stats,
+        }
+
+    async def run(self):
+        ensure_dirs(self.output_dir)
+        self.queue = asyncio.Queue()
+        self.seen = set(self.run_state["visited"])
+        self.pending = {}
+        self.limiters = {}
+        self.stats = {"fetched": 0, "added": 0, "changed": 0, "unchanged": 0,
+                      "not_modified": 0, "errors": 0, "dropped": 0}
+        for url in self.run_state["frontier"]:
+            self.enqueue(url)
+        if self.resumed:
+            print(f"↻ Resuming crawl: {len(self.seen) - len(self.pending)} visited, {len(self.pending)} queued")
+
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(headers=HEADERS, timeout=self.timeout, limits=limits,
+                                     follow_redirects=True) as self.client:
+            workers = [asyncio.create_task(self.worker()) for _ in range(self.concurrency)]
+            try:
+                await self.queue.join()
+            finally:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                self.save_state()
+
+        manifest = self.build_manifest()
+        for item in manifest["removed"]:
+            del self.pages[item["url"]]
+        self.run_state["complete"] = True
+        write_json(self.manifest_path, manifest)
+        self.save_state()
+        print(f"✅ Crawl done: {len(manifest['added'])} added, {len(manifest['changed'])} changed, "
+              f"{len(manifest['removed'])} removed, {self.stats['unchanged'] + self.stats['not_modified']} unchanged")
+        return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental crawl of the COMAR site")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--concurrency", type=int, default=CRAWL_CONCURRENCY)
+    parser.add_argument("--per-host", type=int, default=CRAWL_PER_HOST)
+    parser.add_argument("--delay", type=float, default=CRAWL_DELAY)
+    parser.add_argument("--max-pages", type=int, default=CRAWL_MAX_PAGES)
+    parser.add_argument("--fresh", action="store_true", help="Ignore an interrupted run and start over")
+    args = parser.parse_args()
+
+    crawler = Crawler(args.base_url, args.output_dir, concurrency=args.concurrency, per_host=args.per_host,
+                      delay=args.delay, max_pages=args.max_pages, fresh=args.fresh)
+    asyncio.run(crawler.run())
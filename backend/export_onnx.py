@@ -0,0 +1,101 @@
+"""
+Export du modèle d'embedding en ONNX (fp32) et en int8 (quantification dynamique).
+
+Produit dans data/onnx/<modèle>/ :
+- model.onnx : le transformer de sentence-transformers (états cachés) ;
+- model.int8.onnx : la même chose, poids des couches linéaires quantifiés en int8 ;
+- tokenizer.json et embedding_config.json (longueur max, pooling, normalisation).
+
+Le mean pooling et la normalisation sont refaits par OnnxEmbedder
+(controllers/embedding_backend.py), sélectionné par EMBED_BACKEND=onnx ou
+onnx-int8. Vérifier ensuite la parité avec parity_embeddings.py.
+
+    python export_onnx.py
+    python export_onnx.py --model all-MiniLM-L6-v2 --opset 17
+"""
+import argparse
+import json
+import os
+import torch
+import sentence_transformers
+from sentence_transformers import SentenceTransformer
+from sentence_transformers.models import Normalize, Pooling
+from onnxruntime.quantization import quantize_dynamic, QuantType
+
+from controllers.embedding_backend import onnx_model_dir, ONNX_MODEL_DIR, ONNX_FILES, CONFIG_FILE
+
+INPUT_NAMES = ("input_ids", "attention_mask", "token_type_ids")
+
+
+class HiddenStates(torch.nn.Module):
+    """Transformer seul, entrées positionnelles dans l'ordre de `input_names`."""
+
+    def __init__(self, transformer, input_names):
+        super().__init__()
+        self.transformer = transformer
+        self.input_names = input_names
+
+    def forward(self, *inputs):
+        return self.transformer(**dict(zip(self.input_names, inputs))).last_hidden_state
+
+
+def export(model_name, root=ONNX_MODEL_DIR, opset=17):
+    model = SentenceTransformer(model_name, device="cpu")
+    model.eval()
+    pooling = next(module for module in model if isinstance(module, Pooling))
+    if pooling.get_pooling_mode_str() != "mean":
+        raise SystemExit(f"[ERREUR] Pooling {pooling.get_pooling_mode_str()} non supporté (mean attendu)")
+
+    tokenizer = model.tokenizer
+    sample = tokenizer(["exemple de question", "assurance"], padding=True, return_tensors="pt")
+    input_names = [name for name in INPUT_NAMES if name in sample]
+    directory = onnx_model_dir(model_name, root)
+    os.makedirs(directory, exist_ok=True)
+
+    fp32_path = os.path.join(directory, ONNX_FILES["onnx"])
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            HiddenStates(model[0].auto_model, input_names),
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            do_constant_folding=True,
+            dynamo=False,
+        )
+    print(f"[INFO] {fp32_path} ({os.path.getsize(fp32_path) / 2**20:.1f} MB)")
+
+    int8_path = os.path.join(directory, ONNX_FILES["onnx-int8"])
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"[INFO] {int8_path} ({os.path.getsize(int8_path) / 2**20:.1f} MB)")
+
+    tokenizer.save_pretrained(directory)
+    config = {
+        "model": model_name,
+        "source_version": f"sentence-transformers {sentence_transformers.__version__}",
+        "dimension": model.get_sentence_embedding_dimension(),
+        "max_seq_length": model.max_seq_length,
+        "pooling": "mean",
+        "normalize": any(isinstance(module, Normalize) for module in model),
+        "input_names": input_names,
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+        "opset": opset,
+    }
+    with open(os.path.join(directory, CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    print(f"[DONE] Modèle exporté dans {directory}")
+    return directory
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--output-dir", default=ONNX_MODEL_DIR)
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+    export(args.model, args.output_dir, args.opset)
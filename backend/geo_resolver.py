@@ -0,0 +1,120 @@
+import json
+import hashlib
+import os
+import numpy as np
+
+GAZETTEER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "tunisia_gazetteer.json")
+CACHE_FILE = "gouvernorat_cache.json"
+UNKNOWN = "Unknown"
+# Coordinates are cached at ~10 m precision
+CACHE_DECIMALS = 4
+# Tunisia with a margin: anything outside is not resolved
+BOUNDS = (30.0, 7.0, 37.8, 12.0)
+
+
+def to_unit_vectors(lat_deg, lng_deg):
+    lat, lng = np.radians(lat_deg), np.radians(lng_deg)
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)], axis=-1)
+
+
+def parse_coord(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class GovernorateResolver:
+    """
+    Offline coordinates -> governorate lookup.
+
+    The bundled gazetteer lists, for each of the 24 governorates, its
+    centroid and the seats of its main delegations. A point gets the
+    governorate of the nearest reference point, which approximates the
+    boundaries far better than the 24 centroids alone. Results are kept in
+    a JSON cache keyed by rounded coordinates, invalidated when the
+    gazetteer changes.
+    """
+
+    def __init__(self, gazetteer_file=GAZETTEER_FILE, cache_file=CACHE_FILE):
+        with open(gazetteer_file, "rb") as f:
+            raw = f.read()
+        self.gazetteer_version = hashlib.sha1(raw).hexdigest()[:12]
+        gazetteer = json.loads(raw)
+
+        self.names = [g["name"] for g in gazetteer["governorates"]]
+        owner, lat, lng = [], [], []
+        for i, governorate in enumerate(gazetteer["governorates"]):
+            for point in [governorate["centroid"]] + [place[1:] for place in governorate["places"]]:
+                owner.append(i)
+                lat.append(point[0])
+                lng.append(point[1])
+        self.owner = np.array(owner)
+        self.points = to_unit_vectors(np.array(lat), np.array(lng))
+
+        self.cache_file = cache_file
+        self.cache = {}
+        self.dirty = False
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with open(cache_file, encoding="utf-8") as f:
+                    cached = json.load(f)
+                if cached.get("gazetteer_version") == self.gazetteer_version:
+                    self.cache = cached["entries"]
+            except (OSError, ValueError, KeyError):
+                pass
+
+    @staticmethod
+    def cache_key(lat, lng):
+        return f"{lat:.{CACHE_DECIMALS}f},{lng:.{CACHE_DECIMALS}f}"
+
+    def label(self, index):
+        return f"Gouvernorat {self.names[index]}"
+
+    def resolve_many(self, coords):
+        """Governorate label for each (lat, lng); missing or out-of-country points give UNKNOWN."""
+        results = [UNKNOWN] * len(coords)
+        todo, keys = [], []
+        min_lat, min_lng, max_lat, max_lng = BOUNDS
+        for i, (lat, lng) in enumerate(coords):
+            lat, lng = parse_coord(lat), parse_coord(lng)
+            if lat is None or lng is None or not (min_lat <= lat <= max_lat and min_lng <= lng <= max_lng):
+                continue
+            key = self.cache_key(lat, lng)
+            if key in self.cache:
+                results[i] = self.cache[key]
+            else:
+                todo.append((i, lat, lng))
+                keys.append(key)
+
+        if todo:
+            queries = to_unit_vectors(np.array([t[1] for t in todo]), np.array([t[2] for t in todo]))
+            # Nearest reference point = largest dot product between unit vectors
+            nearest = np.argmax(queries @ self.points.T, axis=1)
+            for (i, _, _), key, point in zip(todo, keys, nearest):
+                results[i] = self.cache[key] = self.label(self.owner[point])
+            self.dirty = True
+        return results
+
+    def resolve(self, lat, lng):
+        return self.resolve_many([(lat, lng)])[0]
+
+    def save(self):
+        if not self.cache_file or not self.dirty:
+            return
+        tmp_path = f"{self.cache_file}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"gazetteer_version": self.gazetteer_version, "entries": self.cache}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_file)
+        self.dirty = False
+
+
+def assign_gouvernorats(agences, resolver=None):
+    """Fill the `gouvernorat` field of every agency in one batch."""
+    resolver = resolver or GovernorateResolver()
+    labels = resolver.resolve_many([(a.get("latitude"), a.get("longitude")) for a in agences])
+    for agence, label in zip(agences, labels):
+        agence["gouvernorat"] = label
+    resolver.save()
+    return agences
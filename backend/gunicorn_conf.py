@@ -0,0 +1,52 @@
+"""
+Configuration gunicorn : workers uvicorn forkés depuis un master qui a déjà
+chargé l'application (mode pré-fork).
+
+    gunicorn -c gunicorn_conf.py maine:app
+
+Le master importe maine une seule fois : KB store, index FAISS, embeddings et
+poids du modèle sont chargés avant le fork, et les workers partagent ces pages
+en copy-on-write au lieu d'en charger chacun une copie.
+measure_worker_memory.py mesure ce qui est effectivement partagé.
+"""
+import gc
+import os
+import sys
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+# PRELOAD_APP=false : chaque worker importe et charge sa propre copie
+preload_app = os.getenv("PRELOAD_APP", "true").lower() in ("1", "true", "yes")
+# Le premier démarrage peut encoder tout l'index
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+# Threads torch / faiss par worker : le parallélisme vient des workers
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "1"))
+
+
+def when_ready(server):
+    if preload_app:
+        # maine ne charge la récupération qu'au démarrage de chaque worker :
+        # on la construit ici, dans le master, pour qu'elle soit héritée du fork
+        from controllers.retrieval import get_retriever
+        get_retriever()
+    # Les objets créés avant le fork sortent du suivi du GC : ses passages
+    # réécriraient leurs en-têtes et dupliqueraient les pages dans chaque worker
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Les pools OpenMP du master ne survivent pas au fork : avec un seul thread,
+    # torch et faiss n'en ont pas besoin dans les workers
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(WORKER_THREADS)
+    faiss = sys.modules.get("faiss")
+    if faiss is not None:
+        faiss.omp_set_num_threads(WORKER_THREADS)
+    # Même chose pour le pool de threads d'onnxruntime (EMBED_BACKEND=onnx / onnx-int8)
+    retrieval = sys.modules.get("controllers.retrieval")
+    retriever = retrieval.current_retriever() if retrieval is not None else None
+    if retriever is not None and hasattr(retriever.embed_model, "after_fork"):
+        retriever.embed_model.after_fork()
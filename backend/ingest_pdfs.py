@@ -0,0 +1,185 @@
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from urllib.parse import unquote
+import fitz  # PyMuPDF
+
+PDF_DIR = "data/pdf_docs"
+OUTPUT_FILE = "data/split_knowledge_base/pdfs.json"
+CACHE_DIR = "data/pdf_cache"
+# Large PDFs are split into page ranges so they are spread over the pool
+PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+EXTRACTOR = f"pymupdf {fitz.VersionBind}"
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def clean_page_text(text):
+    return "\n".join(" ".join(line.split()) for line in text.splitlines() if line.strip())
+
+
+def extract_pages(path, start, end):
+    """Text of pages [start, end) — runs in a worker process."""
+    with fitz.open(path) as doc:
+        return [{"page": number + 1, "text": clean_page_text(doc[number].get_text())}
+                for number in range(start, min(end, doc.page_count))]
+
+
+def load_cached(digest, cache_dir=CACHE_DIR):
+    path = os.path.join(cache_dir, f"{digest}.json")
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return cached["pages"] if cached.get("extractor") == EXTRACTOR else None
+
+
+def save_cached(digest, pages, cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, f"{digest}.json"), "w", encoding="utf-8") as f:
+        json.dump({"extractor": EXTRACTOR, "pages": pages}, f, ensure_ascii=False)
+
+
+def page_entries(filename, digest, pages):
+    """One KB document per non-empty page, keeping the page number as metadata."""
+    name = unquote(os.path.splitext(filename)[0])
+    return [{
+        "title": f"pdfs/{name} (p. {page['page']})",
+        "content": page["text"],
+        "source": unquote(filename),
+        "page": page["page"],
+        "content_hash": digest,
+    } for page in pages if page["text"]]
+
+
+def iter_pdf_documents(pdf_dir=PDF_DIR, cache_dir=CACHE_DIR, workers=PDF_WORKERS,
+                       pages_per_task=PAGES_PER_TASK, stats=None):
+    """
+    Yield (filename, entries) for every PDF of `pdf_dir` as soon as it is extracted.
+
+    Files are identified by the sha1 of their bytes: cached extractions are
+    yielded first without touching the pool, identical files are extracted
+    once, and the remaining ones are split into page ranges extracted in
+    parallel, so one large report does not hold back the small files.
+    """
+    stats = stats if stats is not None else {}
+    stats.update(files=0, cached=0, extracted=0, pages=0, empty_pages=0, failed=0, no_text=[])
+    by_hash = {}
+    for filename in sorted(os.listdir(pdf_dir)):
+        if filename.lower().endswith(".pdf"):
+            path = os.path.join(pdf_dir, filename)
+            by_hash.setdefault(file_hash(path), []).append((filename, path))
+            stats["files"] += 1
+
+    def emit(digest, pages):
+        stats["pages"] += len(pages)
+        stats["empty_pages"] += sum(1 for page in pages if not page["text"])
+        for filename, _ in by_hash[digest]:
+            entries = page_entries(filename, digest, pages)
+            if not entries:
+                # Scanned / image-only PDF: no text layer, nothing reaches the KB
+                stats["no_text"].append(filename)
+                print(f"⚠️ {filename}: no extractable text in {len(pages)} pages (image-only PDF? needs OCR)")
+            yield filename, entries
+
+    pending = {}
+    for digest, files in by_hash.items():
+        pages = load_cached(digest, cache_dir)
+        if pages is not None:
+            stats["cached"] += len(files)
+            yield from emit(digest, pages)
+            continue
+        try:
+            with fitz.open(files[0][1]) as doc:
+                page_count = doc.page_count
+        except Exception as e:
+            stats["failed"] += len(files)
+            print(f"❌ Failed to open {files[0][0]}: {e}")
+            continue
+        ranges = [(start, start + pages_per_task) for start in range(0, page_count, pages_per_task)]
+        pending[digest] = {"path": files[0][1], "ranges": ranges, "pages": [], "left": len(ranges)}
+    if not pending:
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(extract_pages, job["path"], start, end): digest
+            for digest, job in pending.items() for start, end in job["ranges"]
+        }
+        for future in as_completed(futures):
+            digest = futures[future]
+            job = pending[digest]
+            try:
+                job["pages"].extend(future.result())
+            except Exception as e:
+                job["error"] = e
+            job["left"] -= 1
+            if job["left"]:
+                continue
+            if "error" in job:
+                stats["failed"] += len(by_hash[digest])
+                print(f"❌ Failed to extract {by_hash[digest][0][0]}: {job['error']}")
+                continue
+            pages = sorted(job["pages"], key=lambda page: page["page"])
+            save_cached(digest, pages, cache_dir)
+            stats["extracted"] += len(by_hash[digest])
+            yield from emit(digest, pages)
+
+
+def write_knowledge_base(documents, output_file=OUTPUT_FILE):
+    """Stream the entries into `output_file` (JSON list, atomically replaced at the end)."""
+    directory = os.path.dirname(os.path.abspath(output_file))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(output_file))
+    count = 0
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as out:
+            out.write("[")
+            for filename, entries in documents:
+                for entry in entries:
+                    out.write(",\n" if count else "\n")
+                    json.dump(entry, out, ensure_ascii=False, indent=2)
+                    count += 1
+                print(f"📄 {filename}: {len(entries)} pages")
+            out.write("\n]\n")
+        os.replace(tmp_path, output_file)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract data/pdf_docs into the split knowledge base")
+    parser.add_argument("--pdf-dir", default=PDF_DIR)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--workers", type=int, default=PDF_WORKERS)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = {}
+    count = write_knowledge_base(
+        iter_pdf_documents(args.pdf_dir, args.cache_dir, args.workers, stats=stats), args.output
+    )
+    print(f"✅ {count} pages from {stats['files']} PDFs saved to {args.output} "
+          f"({stats['cached']} cached, {stats['extracted']} extracted, {stats['failed']} failed, "
+          f"{stats['empty_pages']} empty pages) in {time.perf_counter() - start:.1f}s")
+    if stats["no_text"]:
+        print(f"⚠️ {len(stats['no_text'])} PDFs without any text, missing from the KB:")
+        for filename in stats["no_text"]:
+            print(f"   - {filename}")
@@ -0,0 +1,299 @@
+import argparse
+import hashlib
+import json
+import os
+import zlib
+from collections import Counter, defaultdict
+import numpy as np
+from controllers.text_processing import normalize_text, get_text_for_embedding
+
+# A line is boilerplate when it appears in at least this share of the pages
+# of its group (all scraped pages, or the pages of one PDF)...
+BOILERPLATE_SHARE = float(os.getenv("BOILERPLATE_SHARE", "0.5"))
+# ...and the group has at least this many pages. Shorter lines (years,
+# "-", table headers) carry meaning in the financial statements and are kept.
+BOILERPLATE_MIN_DOCS = 5
+BOILERPLATE_MIN_WORDS = 3
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+# 32 bands of 4 rows: pairs above ~0.5 Jaccard almost always share a bucket
+LSH_BANDS = 32
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.85"))
+# Lines shared by this many pages of a group (section menus, news sidebars) are
+# left out of the near-duplicate signature, even below BOILERPLATE_SHARE
+TEMPLATE_MIN_DOCS = 3
+# Pages with fewer distinctive words than this are never merged as near duplicates:
+# two pages made only of the same menu are not the same page
+MIN_SIGNATURE_WORDS = 20
+REPORT_FILE = "dedup_report.json"
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+def has_content(doc):
+    return isinstance(doc.get("content"), str)
+
+
+def doc_label(doc):
+    return doc.get("title") or doc.get("nom") or doc.get("code_agence", "")
+
+
+def doc_text(doc):
+    return doc["content"] if has_content(doc) else get_text_for_embedding(doc)
+
+
+def doc_url(doc):
+    if doc.get("url") or doc.get("page_url"):
+        return doc.get("url") or doc.get("page_url")
+    if has_content(doc):
+        # Scraped pages start with "URL: <address>"
+        first = doc["content"].lstrip().split("\n", 1)[0]
+        if first.startswith("URL:"):
+            return first[len("URL:"):].strip()
+    return None
+
+
+def doc_origin(doc):
+    """Title and address of a document, recorded in `merged_from` when it is merged into another."""
+    origin = {"title": doc_label(doc), "url": doc_url(doc)}
+    if doc.get("source"):
+        origin.update(source=doc["source"], page=doc.get("page"))
+    return origin
+
+
+def group_key(doc):
+    # PDF pages group by file, scraped pages by section folder ("pro/...")
+    return doc.get("source") or (doc.get("title") or "").split("/", 1)[0]
+
+
+def strip_boilerplate(docs, share=BOILERPLATE_SHARE, min_docs=BOILERPLATE_MIN_DOCS, min_words=BOILERPLATE_MIN_WORDS):
+    """
+    Remove navigation/header/footer lines repeated across pages.
+    Returns the new documents and {line: number of pages it was removed from}.
+    """
+    groups = defaultdict(list)
+    for i, doc in enumerate(docs):
+        if has_content(doc):
+            groups[doc.get("source", "")].append(i)
+
+    boilerplate = set()
+    for members in groups.values():
+        if len(members) < min_docs:
+            continue
+        counts = Counter(
+            line for i in members for line in {l.strip() for l in docs[i]["content"].splitlines()}
+            if len(line.split()) >= min_words
+        )
+        boilerplate |= {line for line, count in counts.items() if count >= share * len(members)}
+
+    removed = Counter()
+    cleaned = []
+    for doc in docs:
+        if not has_content(doc) or not boilerplate:
+            cleaned.append(doc)
+            continue
+        kept = []
+        for line in doc["content"].splitlines():
+            if line.strip() in boilerplate:
+                removed[line.strip()] += 1
+            else:
+                kept.append(line)
+        cleaned.append({**doc, "content": "\n".join(kept).strip()})
+    return cleaned, dict(removed.most_common())
+
+
+def template_lines(docs, min_docs=TEMPLATE_MIN_DOCS, min_words=BOILERPLATE_MIN_WORDS):
+    """Lines repeated on at least `min_docs` pages of the same group."""
+    counts = defaultdict(Counter)
+    for doc in docs:
+        if has_content(doc):
+            lines = {l.strip() for l in doc["content"].splitlines() if len(l.split()) >= min_words}
+            counts[group_key(doc)].update(lines)
+    return {line for counter in counts.values() for line, count in counter.items() if count >= min_docs}
+
+
+def signature_text(doc, templates):
+    """Distinctive text of a document: without its URL line and the template lines of its group."""
+    if not has_content(doc):
+        return doc_text(doc)
+    return "\n".join(
+        line for line in doc["content"].splitlines()
+        if line.strip() not in templates and not line.startswith("URL:")
+    )
+
+
+def shingles(words, k=SHINGLE_SIZE):
+    if len(words) < k:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+class MinHasher:
+    """MinHash signatures with NUM_PERM universal hash functions (a·x + b mod p)."""
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, MERSENNE_PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, size=(num_perm, 1), dtype=np.uint64)
+
+    def signature(self, shingle_set):
+        if not shingle_set:
+            return np.full(len(self.a), MERSENNE_PRIME, dtype=np.uint64)
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) & MERSENNE_PRIME for s in shingle_set),
+                             dtype=np.uint64, count=len(shingle_set))
+        return ((self.a * hashes + self.b) % MERSENNE_PRIME).min(axis=1)
+
+
+def lsh_candidates(signatures, bands=LSH_BANDS):
+    """Pairs (i, j) sharing at least one band bucket."""
+    rows = signatures.shape[1] // bands
+    pairs = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for i, sig in enumerate(signatures[:, band * rows:(band + 1) * rows]):
+            buckets[sig.tobytes()].append(i)
+        for members in buckets.values():
+            pairs.update((members[x], members[y]) for x in range(len(members)) for y in range(x + 1, len(members)))
+    return pairs
+
+
+def keep_order(doc, text):
+    # Structured records (agences, santé sheets) win over scraped pages, then the longest text
+    return (not has_content(doc), len(text))
+
+
+def merge_into(kept, dropped):
+    """Record the dropped documents on the kept one, so a merge never loses a source."""
+    origins = kept.get("merged_from", []) + [doc_origin(doc) for doc in dropped]
+    for doc in dropped:
+        origins += doc.get("merged_from", [])
+    return {**kept, "merged_from": origins}
+
+
+def dedupe_documents(docs, threshold=NEAR_DUP_THRESHOLD):
+    """
+    Strip boilerplate, then drop exact and near-duplicate documents.
+    Near duplicates are judged on the distinctive text of each page only
+    (`signature_text`); the kept document lists what it absorbed in `merged_from`.
+    Returns the kept documents (original order) and a report of what was removed.
+    """
+    docs, boilerplate = strip_boilerplate(docs)
+    texts = [" ".join(normalize_text(doc_text(doc)).split()) for doc in docs]
+    keep = [bool(text) for text in texts]
+    report = {
+        "input_documents": len(docs),
+        "boilerplate_lines": boilerplate,
+        "empty": [doc_label(doc) for doc, k in zip(docs, keep) if not k],
+        "exact_duplicates": [],
+        "near_duplicates": [],
+    }
+
+    # Exact duplicates of the normalized text
+    by_hash = defaultdict(list)
+    for i, text in enumerate(texts):
+        if keep[i]:
+            by_hash[hashlib.sha1(text.encode("utf-8")).hexdigest()].append(i)
+    for members in by_hash.values():
+        if len(members) > 1:
+            best = max(members, key=lambda i: keep_order(docs[i], texts[i]))
+            for i in members:
+                if i != best:
+                    keep[i] = False
+            dropped = [docs[i] for i in members if i != best]
+            docs[best] = merge_into(docs[best], dropped)
+            report["exact_duplicates"].append({
+                "kept": doc_label(docs[best]),
+                "dropped": [doc_origin(doc) for doc in dropped],
+            })
+
+    # Near duplicates: MinHash + LSH, candidates checked on the estimated Jaccard
+    templates = template_lines(docs)
+    signed = {i: normalize_text(signature_text(docs[i], templates)).split() for i in range(len(docs)) if keep[i]}
+    remaining = [i for i, words in signed.items() if len(words) >= MIN_SIGNATURE_WORDS]
+    report["too_short_to_compare"] = len(signed) - len(remaining)
+    shingle_sets = [shingles(signed[i]) for i in remaining]
+    hasher = MinHasher()
+    signatures = np.stack([hasher.signature(s) for s in shingle_sets]) if remaining else np.empty((0, NUM_PERM))
+    parent = list(range(len(remaining)))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    similarity = {}
+    for x, y in lsh_candidates(signatures):
+        estimate = float(np.mean(signatures[x] == signatures[y]))
+        if estimate >= threshold:
+            similarity[(x, y)] = estimate
+            parent[find(x)] = find(y)
+
+    clusters = defaultdict(list)
+    for x in range(len(remaining)):
+        clusters[find(x)].append(x)
+    for members in clusters.values():
+        if len(members) == 1:
+            continue
+        best = max(members, key=lambda x: keep_order(docs[remaining[x]], texts[remaining[x]]))
+        dropped = []
+        for x in members:
+            if x == best:
+                continue
+            keep[remaining[x]] = False
+            pair = (min(x, best), max(x, best))
+            dropped.append({
+                **doc_origin(docs[remaining[x]]),
+                "similarity": round(similarity.get(pair, float(np.mean(signatures[x] == signatures[best]))), 3),
+            })
+        docs[remaining[best]] = merge_into(docs[remaining[best]], [docs[remaining[x]] for x in members if x != best])
+        report["near_duplicates"].append({"kept": doc_label(docs[remaining[best]]), "dropped": dropped})
+
+    kept = [doc for doc, k in zip(docs, keep) if k]
+    report["output_documents"] = len(kept)
+    return kept, report
+
+
+def dedupe_sections(sections, threshold=NEAR_DUP_THRESHOLD):
+    """Same as dedupe_documents over {section: documents}, deduplicating across sections."""
+    flat = [(name, doc) for name, docs in sections.items() for doc in docs]
+    if not flat:
+        return {}, dedupe_documents([], threshold)[1]
+    tagged = [{**doc, "_section": name} for name, doc in flat]
+    kept, report = dedupe_documents(tagged, threshold)
+    result = {name: [] for name in sections}
+    for doc in kept:
+        result[doc.pop("_section")].append(doc)
+    return result, report
+
+
+def write_report(report, path=REPORT_FILE):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"🧹 {report['input_documents'] - report['output_documents']} documents removed "
+          f"({len(report['exact_duplicates'])} exact groups, {len(report['near_duplicates'])} near-duplicate groups, "
+          f"{len(report['empty'])} empty), {len(report['boilerplate_lines'])} boilerplate lines stripped "
+          f"— report in {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deduplicate a split knowledge base folder in place")
+    parser.add_argument("folder", nargs="?", default="data/split_knowledge_base")
+    parser.add_argument("--report", default=REPORT_FILE)
+    parser.add_argument("--threshold", type=float, default=NEAR_DUP_THRESHOLD)
+    parser.add_argument("--dry-run", action="store_true", help="Only write the report")
+    args = parser.parse_args()
+
+    original = {}
+    for filename in sorted(os.listdir(args.folder)):
+        if filename.endswith(".json"):
+            with open(os.path.join(args.folder, filename), encoding="utf-8") as f:
+                original[filename[:-len(".json")]] = json.load(f)
+    sections, report = dedupe_sections(original, args.threshold)
+    write_report(report, args.report)
+    if not args.dry_run:
+        for name, entries in sections.items():
+            if entries == original[name]:
+                continue
+            with open(os.path.join(args.folder, f"{name}.json"), "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False, indent=2)
+                f.write("\n")
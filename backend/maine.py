@@ -5,8 +5,13 @@ from slowapi import Limiter
 from slowapi.util import get_remote_address
 from dotenv import load_dotenv
 import logging
+from contextlib import asynccontextmanager
 
-from routes import mistral,questions,tags,agence
+from routes import mistral,questions,tags,agence,admin
+from controllers.mistral_client import mistral_client
+from controllers.retrieval_service import retrieval_service
+from controllers.readiness import retrieval_readiness, RETRY_AFTER_SECONDS
+from controllers.snapshots import snapshot_manager
 
 load_dotenv()
 
@@ -17,8 +22,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Shared HTTP client and retrieval batcher for the whole app lifetime.
+# The retrieval stack loads in the background: the port is bound right away.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await mistral_client.start()
+    retrieval_readiness.start()
+    snapshot_manager.start_watching()
+    yield
+    await snapshot_manager.close()
+    await retrieval_service.close()
+    await mistral_client.close()
+
 # App
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Rate Limiting
 limiter = Limiter(key_func=get_remote_address)
@@ -38,14 +55,30 @@ app.include_router(mistral.router)
 app.include_router(questions.router)
 app.include_router(tags.router, prefix="/api", tags=["Tags"])
 app.include_router(agence.router)
+app.include_router(admin.router)
 @app.get("/")
 async def root():
     return {"message": "Welcome to COMAR chatbot backend!"}
 
+# Liveness: the process is up and serving
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+# Readiness: retrieval (embedding model + index) is loaded and warmed up
+@app.get("/readyz")
+async def readyz():
+    status = retrieval_readiness.status()
+    if not retrieval_readiness.ready:
+        return JSONResponse(status_code=503, content=status,
+                            headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+    return status
+
 # Global error handler
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
-    return JSONResponse(status_code=exc.status_code, content={"message": exc.detail})
+    return JSONResponse(status_code=exc.status_code, content={"message": exc.detail},
+                        headers=getattr(exc, "headers", None))
 
 # Dev entry point
 if __name__ == "__main__":
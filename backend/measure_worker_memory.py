@@ -0,0 +1,182 @@
+"""
+Mémoire par worker d'un déploiement gunicorn / uvicorn en cours d'exécution (Linux).
+
+Pour chaque processus, lit /proc/<pid>/smaps_rollup et rapporte :
+- unique : pages privées (USS), libérées si le worker s'arrête ;
+- shared : pages mappées aussi par un autre processus (poids du modèle chargés
+  avant le fork, faiss.index / embeddings.npy / data/kb_store ouverts en mmap) ;
+- pss : part proportionnelle, les pages partagées étant divisées entre leurs
+  utilisateurs ; la somme des PSS est l'empreinte réelle du déploiement.
+
+Le coût marginal d'un worker supplémentaire est son `unique` moyen.
+
+    python measure_worker_memory.py --pid <pid du master gunicorn>
+    python measure_worker_memory.py --match "maine:app" --files 10
+    python measure_worker_memory.py --pid 1234 --output mem.json
+
+Comparer PRELOAD_APP=false / INDEX_MMAP=false à la configuration par défaut
+pour mesurer ce que rapportent le chargement pré-fork et le mmap.
+"""
+import argparse
+import json
+import os
+import re
+
+ROLLUP_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty", "Anonymous")
+MAPPING_HEADER = re.compile(r"^[0-9a-f]+-[0-9a-f]+\s")
+
+
+def parent_pid(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        stat = f.read()
+    # Le nom du processus (entre parenthèses) peut contenir des espaces
+    return int(stat[stat.rindex(")") + 2:].split()[1])
+
+
+def cmdline(pid):
+    with open(f"/proc/{pid}/cmdline", "rb") as f:
+        return f.read().replace(b"\0", b" ").decode("utf-8", "replace").strip()
+
+
+def all_pids():
+    return [int(name) for name in os.listdir("/proc") if name.isdigit()]
+
+
+def process_tree(root):
+    """`root` puis tous ses descendants (workers gunicorn ou multiprocessing)."""
+    children = {}
+    for pid in all_pids():
+        try:
+            children.setdefault(parent_pid(pid), []).append(pid)
+        except (OSError, ValueError, IndexError):
+            continue
+    tree, todo = [], [root]
+    while todo:
+        pid = todo.pop()
+        tree.append(pid)
+        todo.extend(sorted(children.get(pid, []), reverse=True))
+    return tree
+
+
+def matching_pids(pattern):
+    pids = []
+    for pid in all_pids():
+        if pid == os.getpid():
+            continue
+        try:
+            if pattern in cmdline(pid):
+                pids.append(pid)
+        except OSError:
+            continue
+    return sorted(pids)
+
+
+def parse_kb(line):
+    name, value = line.split(":", 1)
+    return name, int(value.split()[0])
+
+
+def rollup(pid):
+    """Compteurs de /proc/<pid>/smaps_rollup, en kB."""
+    totals = dict.fromkeys(ROLLUP_FIELDS, 0)
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if MAPPING_HEADER.match(line) or not line.rstrip().endswith("kB"):
+                continue
+            name, value = parse_kb(line)
+            if name in totals:
+                totals[name] = value
+    return {
+        "rss_kb": totals["Rss"],
+        "pss_kb": totals["Pss"],
+        "unique_kb": totals["Private_Clean"] + totals["Private_Dirty"],
+        "shared_kb": totals["Shared_Clean"] + totals["Shared_Dirty"],
+        "anonymous_kb": totals["Anonymous"],
+    }
+
+
+def file_mappings(pid):
+    """{chemin: compteurs} des mappings adossés à un fichier, depuis /proc/<pid>/smaps."""
+    mappings, current = {}, None
+    with open(f"/proc/{pid}/smaps") as f:
+        for line in f:
+            if MAPPING_HEADER.match(line):
+                fields = line.split(None, 5)
+                path = fields[5].strip() if len(fields) > 5 else ""
+                current = mappings.setdefault(path, {"rss_kb": 0, "pss_kb": 0, "unique_kb": 0, "shared_kb": 0}) \
+                    if path.startswith("/") else None
+                continue
+            if current is None or not line.rstrip().endswith("kB"):
+                continue
+            name, value = parse_kb(line)
+            if name == "Rss":
+                current["rss_kb"] += value
+            elif name == "Pss":
+                current["pss_kb"] += value
+            elif name in ("Private_Clean", "Private_Dirty"):
+                current["unique_kb"] += value
+            elif name in ("Shared_Clean", "Shared_Dirty"):
+                current["shared_kb"] += value
+    return mappings
+
+
+def mb(kb):
+    return round(kb / 1024, 1)
+
+
+def measure(pids, root=None, top_files=0):
+    processes = []
+    for pid in pids:
+        try:
+            entry = {"pid": pid, "role": "master" if pid == root else "worker", "cmdline": cmdline(pid)[:80]}
+            entry.update(rollup(pid))
+            if top_files:
+                files = sorted(file_mappings(pid).items(), key=lambda item: item[1]["rss_kb"], reverse=True)
+                entry["files"] = [{"path": path, **counters} for path, counters in files[:top_files]]
+        except OSError:
+            continue  # processus terminé entre-temps
+        processes.append(entry)
+
+    workers = [p for p in processes if p["role"] == "worker"] or processes
+    summary = {
+        "processes": len(processes),
+        "workers": len(workers),
+        "total_rss_mb": mb(sum(p["rss_kb"] for p in processes)),
+        "total_pss_mb": mb(sum(p["pss_kb"] for p in processes)),
+        "worker_unique_mb_mean": mb(sum(p["unique_kb"] for p in workers) / max(len(workers), 1)),
+        "worker_shared_mb_mean": mb(sum(p["shared_kb"] for p in workers) / max(len(workers), 1)),
+    }
+    return {"summary": summary, "processes": processes}
+
+
+def print_report(report):
+    print(f"{'pid':>8} {'rôle':<7} {'rss MB':>9} {'pss MB':>9} {'unique MB':>10} {'shared MB':>10}  commande")
+    for p in report["processes"]:
+        print(f"{p['pid']:>8} {p['role']:<7} {mb(p['rss_kb']):>9} {mb(p['pss_kb']):>9} "
+              f"{mb(p['unique_kb']):>10} {mb(p['shared_kb']):>10}  {p['cmdline']}")
+        for file in p.get("files", []):
+            print(f"{'':>17} {mb(file['rss_kb']):>9} {mb(file['pss_kb']):>9} "
+                  f"{mb(file['unique_kb']):>10} {mb(file['shared_kb']):>10}    {file['path']}")
+    s = report["summary"]
+    print(f"\n[INFO] {s['processes']} processus, dont {s['workers']} workers : "
+          f"RSS cumulée {s['total_rss_mb']} MB, empreinte réelle (somme PSS) {s['total_pss_mb']} MB")
+    print(f"[INFO] Par worker : {s['worker_unique_mb_mean']} MB uniques (coût d'un worker de plus), "
+          f"{s['worker_shared_mb_mean']} MB partagés")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mémoire unique / partagée par worker")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--pid", type=int, help="pid du master ; ses descendants sont mesurés")
+    target.add_argument("--match", help="mesure les processus dont la ligne de commande contient ce texte")
+    parser.add_argument("--files", type=int, default=0, help="détaille les N plus gros fichiers mappés")
+    parser.add_argument("--output", help="fichier JSON de résultats")
+    args = parser.parse_args()
+
+    pids = process_tree(args.pid) if args.pid else matching_pids(args.match)
+    report = measure(pids, root=args.pid, top_files=args.files)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"[DONE] Résultats écrits dans {args.output}")
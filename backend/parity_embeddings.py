@@ -0,0 +1,189 @@
+"""
+Parité des backends d'embedding ONNX avec le modèle torch de référence.
+
+Pour chaque backend exporté par export_onnx.py (onnx, onnx-int8), comparé à
+SentenceTransformer (torch) sur les passages du KB store et les requêtes :
+- accord cosinus ligne à ligne (moyenne et minimum) entre les deux embeddings ;
+- recall@k sur data/benchmark_queries.json, avec un index plat par backend
+  (mêmes règles de pertinence que benchmark_retrieval.py), et recouvrement
+  des top-k avec ceux de torch ;
+- latence p50 / p95 d'encodage d'une requête seule et d'un batch ;
+- dans un processus neuf : temps d'import + chargement du modèle et mémoire
+  résidente après un premier encodage.
+
+Code retour 1 si un backend passe sous les seuils (--min-cosine,
+--min-cosine-int8, --recall-tolerance).
+
+    python parity_embeddings.py
+    python parity_embeddings.py --backends onnx-int8 --output parity.json
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+import numpy as np
+import faiss
+
+from controllers.text_processing import normalize_text
+from controllers.kb_store import kb_store
+from controllers.embedding_backend import load_embed_model, EMBED_BATCH_SIZE
+
+FOOTPRINT_SCRIPT = """
+import json, resource, sys, time
+started = time.perf_counter()
+from controllers.embedding_backend import load_embed_model
+model = load_embed_model(sys.argv[1], sys.argv[2], threads=int(sys.argv[3]))
+loaded = time.perf_counter() - started
+model.encode(["assurance automobile"], convert_to_numpy=True)
+print(json.dumps({
+    "load_seconds": round(loaded, 3),
+    "rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    "torch_imported": "torch" in sys.modules,
+}))
+"""
+
+
+def percentiles(values):
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+    }
+
+
+def normalized(embeddings):
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32).copy()
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+
+def cosine_agreement(reference, candidate):
+    cosines = (normalized(reference) * normalized(candidate)).sum(axis=1)
+    return {"mean": round(float(cosines.mean()), 5), "min": round(float(cosines.min()), 5)}
+
+
+def source_names(position):
+    # Titre du document conservé et des doublons fusionnés dedans par kb_dedup.py
+    parent = kb_store[int(kb_store.chunk_parent[position])]
+    titles = [parent.get("title") or parent.get("nom") or ""]
+    titles += [origin["title"] for origin in parent.get("merged_from", [])]
+    return [normalize_text(title) for title in titles]
+
+
+def is_relevant(position, expected):
+    names = source_names(position)
+    return any(name.startswith(normalize_text(e)) for name in names for e in expected)
+
+
+def search(passages, queries, top_k):
+    index = faiss.IndexFlatIP(passages.shape[1])
+    index.add(normalized(passages))
+    return index.search(normalized(queries), top_k)[1]
+
+
+def recall(positions, labeled):
+    recalls = []
+    for row, item in zip(positions, labeled):
+        expected = item["expected"]
+        found = {e for e in expected for p in row if p >= 0 and is_relevant(p, [e])}
+        recalls.append(len(found) / len(expected))
+    return round(float(np.mean(recalls)), 4)
+
+
+def overlap(reference, candidate):
+    return round(float(np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(reference, candidate)])), 4)
+
+
+def encode_latency(model, queries, repeat):
+    single, batch = [], []
+    for _ in range(repeat):
+        for query in queries:
+            t = time.perf_counter()
+            model.encode([query], convert_to_numpy=True)
+            single.append((time.perf_counter() - t) * 1000)
+        t = time.perf_counter()
+        model.encode(queries[:EMBED_BATCH_SIZE], convert_to_numpy=True)
+        batch.append((time.perf_counter() - t) * 1000)
+    return {"single": percentiles(single), f"batch_{min(len(queries), EMBED_BATCH_SIZE)}": percentiles(batch)}
+
+
+def footprint(model_name, backend, threads):
+    """Import + chargement et RSS d'un processus qui ne charge que ce backend."""
+    result = subprocess.run(
+        [sys.executable, "-c", FOOTPRINT_SCRIPT, model_name, backend, str(threads)],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "échec"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--backends", default="onnx,onnx-int8")
+    parser.add_argument("--questions", default="data/questions.json")
+    parser.add_argument("--labeled", default="data/benchmark_queries.json")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=1, help="threads intra-op pour les mesures")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="cosinus minimal (onnx fp32)")
+    parser.add_argument("--min-cosine-int8", type=float, default=0.95, help="cosinus minimal (onnx-int8)")
+    parser.add_argument("--recall-tolerance", type=float, default=0.02)
+    parser.add_argument("--output", help="fichier JSON de résultats")
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = [q["question"] for q in json.load(f)]
+    with open(args.labeled, encoding="utf-8") as f:
+        labeled = json.load(f)
+    # Textes tels que le Retriever les encode (passages normalisés, requêtes normalisées)
+    passages = list(kb_store.embedding_texts)
+    queries = [normalize_text(q) for q in questions + [item["query"] for item in labeled]]
+    labeled_queries = [normalize_text(item["query"]) for item in labeled]
+    print(f"[INFO] {len(passages)} passages, {len(queries)} requêtes, {len(labeled)} annotées")
+
+    results, failures = {"model": args.model, "k": args.k, "threads": args.threads, "backends": {}}, []
+    reference_positions = reference_recall = None
+    reference = {}
+    for backend in ["torch"] + args.backends.split(","):
+        print(f"[INFO] Backend {backend}")
+        model = load_embed_model(args.model, backend, threads=args.threads)
+        passage_emb = model.encode(passages, convert_to_numpy=True)
+        query_emb = model.encode(queries, convert_to_numpy=True)
+        positions = search(passage_emb, model.encode(labeled_queries, convert_to_numpy=True), args.k)
+        entry = {
+            f"recall@{args.k}": recall(positions, labeled),
+            "encode_latency": encode_latency(model, queries, args.repeat),
+            "footprint": footprint(args.model, backend, args.threads),
+        }
+        if backend == "torch":
+            reference = {"passages": passage_emb, "queries": query_emb}
+            reference_positions, reference_recall = positions, entry[f"recall@{args.k}"]
+        else:
+            entry["cosine_passages"] = cosine_agreement(reference["passages"], passage_emb)
+            entry["cosine_queries"] = cosine_agreement(reference["queries"], query_emb)
+            entry[f"top{args.k}_overlap"] = overlap(reference_positions, positions)
+            min_cosine = args.min_cosine_int8 if backend.endswith("int8") else args.min_cosine
+            for name in ("cosine_passages", "cosine_queries"):
+                if entry[name]["mean"] < min_cosine:
+                    failures.append(f"{backend} {name} : {entry[name]['mean']} < {min_cosine}")
+            if entry[f"recall@{args.k}"] < reference_recall - args.recall_tolerance:
+                failures.append(f"{backend} recall@{args.k} : {reference_recall} -> {entry[f'recall@{args.k}']}")
+        results["backends"][backend] = entry
+        del model
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"[DONE] Résultats écrits dans {args.output}")
+    for failure in failures:
+        print(f"[REGRESSION] {failure}")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Profil du démarrage à froid de l'API.
+
+1. `python -X importtime -c "import maine"` dans un processus neuf : durée
+   totale de l'import, modules les plus coûteux (temps cumulé) et présence des
+   bibliothèques lourdes (torch, sentence_transformers, transformers) qui ne
+   doivent plus être chargées à l'import ;
+2. avec --ready, démarre l'application (lifespan compris) et mesure le délai
+   avant la première réponse de /healthz puis avant que /readyz réponde 200.
+
+    python profile_startup.py
+    python profile_startup.py --top 25 --ready --output startup.json
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ("torch", "sentence_transformers", "transformers", "faiss")
+
+
+def import_profile(module="maine"):
+    """[(module, temps propre µs, temps cumulé µs)] mesurés par -X importtime."""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise SystemExit(f"[ERREUR] import {module} a échoué :\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows, wall
+
+
+def time_to_ready(timeout=600):
+    """Secondes avant la première réponse de /healthz, puis avant /readyz == 200."""
+    from fastapi.testclient import TestClient
+
+    started = time.perf_counter()
+    import maine
+
+    with TestClient(maine.app) as client:
+        client.get("/healthz").raise_for_status()
+        healthy = time.perf_counter() - started
+        while True:
+            response = client.get("/readyz")
+            if response.status_code == 200:
+                return healthy, time.perf_counter() - started, response.json()
+            if response.json().get("status") == "failed" or time.perf_counter() - started > timeout:
+                return healthy, None, response.json()
+            time.sleep(0.1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profil d'import et de démarrage de maine")
+    parser.add_argument("--top", type=int, default=15, help="nombre de modules affichés")
+    parser.add_argument("--ready", action="store_true", help="mesure aussi le délai avant /readyz")
+    parser.add_argument("--output", help="fichier JSON de résultats")
+    args = parser.parse_args()
+
+    rows, wall = import_profile()
+    loaded = {name for name, _, _ in rows}
+    total_us = max((cumulative for name, _, cumulative in rows if name == "maine"), default=0)
+    print(f"[INFO] import maine : {total_us / 1e6:.2f}s ({wall:.2f}s avec le démarrage de l'interpréteur)")
+    print(f"{'cumulé ms':>10} {'propre ms':>10}  module")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>10.1f} {self_us / 1000:>10.1f}  {name}")
+    heavy = {module: module in loaded for module in HEAVY_MODULES}
+    print("[INFO] Modules lourds importés : "
+          + ", ".join(f"{module}={'oui' if imported else 'non'}" for module, imported in heavy.items()))
+
+    results = {
+        "import_seconds": round(total_us / 1e6, 3),
+        "process_seconds": round(wall, 3),
+        "heavy_modules": heavy,
+        "top_modules": [
+            {"module": name, "self_ms": round(self_us / 1000, 1), "cumulative_ms": round(cumulative_us / 1000, 1)}
+            for name, self_us, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True)[:args.top]
+        ],
+    }
+    if args.ready:
+        healthy, ready, status = time_to_ready()
+        results.update(healthz_seconds=round(healthy, 3),
+                       ready_seconds=round(ready, 3) if ready is not None else None, readyz=status)
+        print(f"[INFO] /healthz après {healthy:.2f}s, "
+              + (f"/readyz prêt après {ready:.2f}s" if ready is not None else f"/readyz : {status}"))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"[DONE] Résultats écrits dans {args.output}")
@@ -0,0 +1,29 @@
+import os
+import secrets
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from controllers.readiness import retrieval_readiness
+from controllers.snapshots import snapshot_manager
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+# Without ADMIN_TOKEN the admin endpoints are disabled
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def require_admin(x_admin_token: str = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@router.get("/snapshot", dependencies=[Depends(require_admin)])
+async def snapshot_status():
+    return snapshot_manager.status()
+
+
+@router.post("/snapshot/reload", status_code=202,
+             dependencies=[Depends(require_admin), Depends(retrieval_readiness.require)])
+async def reload_snapshot(force: bool = Query(False, description="Rebuild even if the source JSON files did not change")):
+    # Built in the background: poll GET /admin/snapshot for the new version
+    return snapshot_manager.reload(force=force)
@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Query, HTTPException
-from typing import List
-from controllers.agence_controller import find_nearest_agences
+from fastapi import APIRouter, Query, HTTPException, Request, Response
+from typing import List, Optional
+from controllers.agence_controller import find_nearest_agences, prepared_agences
+from controllers.agence_clusters import cluster_layer, parse_bbox, MIN_ZOOM, MAX_ZOOM
+from controllers.response_cache import _etag_matches
 from models.agence import Agence
 
 router = APIRouter()
@@ -9,10 +11,36 @@ router = APIRouter()
 def get_nearby_agences(
     lat: float = Query(..., description="User latitude"),
     lng: float = Query(..., description="User longitude"),
-    limit: int = Query(5, description="Number of nearest agences to return"),
+    limit: int = Query(5, ge=1, description="Number of nearest agences to return"),
+    max_km: Optional[float] = Query(None, gt=0, description="Only return agences within this radius (km)"),
+    type: Optional[str] = Query(None, description="Agence type: Agent or Succursale"),
+    gouvernorat: Optional[str] = Query(None, description="Gouvernorat name, e.g. Tunis or Gouvernorat Sfax"),
 ):
     if not (-90 <= lat <= 90) or not (-180 <= lng <= 180):
         raise HTTPException(status_code=400, detail="Invalid latitude or longitude values")
 
-    agences = find_nearest_agences(user_lat=lat, user_lng=lng, limit=limit)
+    agences = find_nearest_agences(user_lat=lat, user_lng=lng, limit=limit, max_km=max_km,
+                                   agence_type=type, gouvernorat=gouvernorat)
     return agences
+
+@router.get("/agences", response_model=List[Agence])
+def get_all_agences(request: Request):
+    return prepared_agences().respond(request)
+
+@router.get("/agences/clusters")
+def get_agence_clusters(
+    request: Request,
+    zoom: int = Query(..., ge=MIN_ZOOM, le=MAX_ZOOM, description="Leaflet map zoom level"),
+    bbox: Optional[str] = Query(None, description="Visible area as 'west,south,east,north'"),
+):
+    try:
+        bounds = parse_bbox(bbox) if bbox else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    body, etag = cluster_layer.render(zoom, bounds)
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=300"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,6 +1,13 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from controllers.mistral_controller import generate_course_response
+from controllers.mistral_controller import generate_course_response, stream_course_response
+from controllers.answer_cache import answer_cache
+from controllers.retrieval_service import retrieval_service
+from controllers.retrieval import current_retriever
+from controllers.readiness import retrieval_readiness
+from controllers.snapshots import snapshot_manager
+from controllers.context_packer import context_packer
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
@@ -12,7 +19,32 @@ class CourseRequest(BaseModel):
     language: str = Field(default="fr", min_length=2, max_length=2)
 
 
-@router.post("/generate-course")
+@router.post("/generate-course", dependencies=[Depends(retrieval_readiness.require)])
 @limiter.limit("5/minute")
-async def generate_course(request: Request, payload: CourseRequest):
-    return await generate_course_response(payload)
+async def generate_course(request: Request, response: Response, payload: CourseRequest):
+    result = await generate_course_response(payload)
+    response.headers["X-KB-Version"] = result["version"]
+    return result
+
+
+@router.post("/generate-course/stream", dependencies=[Depends(retrieval_readiness.require)])
+@limiter.limit("5/minute")
+async def generate_course_stream(request: Request, payload: CourseRequest):
+    events, version = await stream_course_response(request, payload)
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-KB-Version": version},
+    )
+
+
+@router.get("/generate-course/cache-stats")
+async def generate_course_cache_stats():
+    retriever = current_retriever()
+    return {
+        **answer_cache.stats(),
+        "retrieval": retrieval_service.stats(),
+        "reranker": retriever.reranker.stats() if retriever and retriever.reranker else None,
+        "context": context_packer.stats(),
+        "snapshot": snapshot_manager.status(),
+    }
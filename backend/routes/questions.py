@@ -1,4 +1,4 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from typing import List
 from models.question import Question
 from controllers import questions_controller
@@ -6,12 +6,12 @@ from controllers import questions_controller
 router = APIRouter(prefix="/questions", tags=["Questions"])
 
 @router.get("/", response_model=List[Question])
-def all_questions():
-    return questions_controller.load_all_questions()
+def all_questions(request: Request):
+    return questions_controller.prepared_all_questions().respond(request)
 
 @router.get("/branch/{branch_name}", response_model=List[Question])
-def questions_by_branch(branch_name: str):
-    return questions_controller.get_questions_by_branch(branch_name)
+def questions_by_branch(branch_name: str, request: Request):
+    return questions_controller.prepared_questions_by_branch(branch_name).respond(request)
 
 @router.get("/search/{tag}", response_model=List[Question])
 def questions_by_tag(tag: str):
@@ -6,5 +6,8 @@ from models.question import Question
 router = APIRouter()
 
 @router.get("/tags/questions", response_model=List[Question])
-def fetch_questions_by_tags(tags: List[str] = Query(..., description="List of tags to filter questions")):
-    return get_questions_by_tags(tags)
+def fetch_questions_by_tags(
+    tags: List[str] = Query(..., description="List of tags to filter questions"),
+    match: str = Query("any", pattern="^(any|all)$", description="'any': at least one tag, ranked by matches; 'all': every tag"),
+):
+    return get_questions_by_tags(tags, match)
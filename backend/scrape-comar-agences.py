@@ -1,38 +1,59 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import json
+import os
 import time
-from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
+from geo_resolver import assign_gouvernorats
 
 BASE_URL = "https://www.comar.tn"
 HEADERS = {
     "User-Agent": "Mozilla/5.0"
 }
-
-# Initialize geolocator with user_agent
-geolocator = Nominatim(user_agent="comar_agency_locator")
-# Rate limiter to avoid hitting usage limits (1 call per second)
-reverse = RateLimiter(geolocator.reverse, min_delay_seconds=1)
-
-def find_gouvernorat_from_coords(lat, lon):
-    if not lat or not lon:
-        return "Unknown"
+OUTPUT_FILE = "comar_agences_data.json"
+# Validators and body hash of every detail page, for incremental refreshes
+STATE_FILE = "comar_agences_state.json"
+# Detail pages fetched in parallel over one pooled session
+MAX_WORKERS = int(os.getenv("AGENCES_MAX_WORKERS", "8"))
+# Pages validated less than this many seconds ago are not requested at all
+REFRESH_AFTER = float(os.getenv("AGENCES_REFRESH_AFTER", "0"))
+LISTINGS = [
+    (f"{BASE_URL}/nos-agences?type=52", "Agent"),
+    (f"{BASE_URL}/nos-agences?type=51", "Succursale"),
+]
+
+def make_session(pool_size=MAX_WORKERS):
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                  respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def load_json(path, default):
+    if not os.path.exists(path):
+        return default
     try:
-        location = reverse((lat, lon), language='fr')
-        if location and 'address' in location.raw:
-            address = location.raw['address']
-            # 'state' field usually contains the gouvernorat in Tunisia
-            gouvernorat = address.get('state') or address.get('county') or "Unknown"
-            return gouvernorat
-    except Exception as e:
-        print(f"[ERROR] Reverse geocoding failed for ({lat}, {lon}): {e}")
-    return "Unknown"
-
-def get_agences_urls(list_url):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def get_agences_urls(session, list_url):
     print(f"[INFO] Fetching agences list page: {list_url} ...")
-    resp = requests.get(list_url, headers=HEADERS)
+    resp = session.get(list_url, timeout=15)
     resp.raise_for_status()
     soup = BeautifulSoup(resp.content, "html.parser")
     links = soup.select("div.node--type-agence h2 a")
@@ -40,11 +61,8 @@ def get_agences_urls(list_url):
     print(f"[INFO] Found {len(urls)} agences URLs.")
     return urls
 
-def scrape_agence_detail(url, agence_type):
-    print(f"[INFO] Scraping agence detail from: {url}")
-    resp = requests.get(url, headers=HEADERS)
-    resp.raise_for_status()
-    soup = BeautifulSoup(resp.content, "html.parser")
+def parse_agence_detail(html, url, agence_type):
+    soup = BeautifulSoup(html, "html.parser")
 
     def get_text(selector):
         el = soup.select_one(selector)
@@ -71,15 +89,12 @@ def scrape_agence_detail(url, agence_type):
     lat = coord_div['data-lat'] if coord_div and 'data-lat' in coord_div.attrs else ""
     lng = coord_div['data-lng'] if coord_div and 'data-lng' in coord_div.attrs else ""
 
-    # Use reverse geocoding to get gouvernorat
-    gouvernorat = find_gouvernorat_from_coords(lat, lng)
-
     img_el = soup.select_one("div.field--name-field-image img")
     img_url = urljoin(BASE_URL, img_el['src']) if img_el else ""
 
     return {
         "nom": name,
-        "gouvernorat": gouvernorat,
+        "gouvernorat": "",  # filled offline by assign_gouvernorats
         "adresse": adresse,
         "telephone": tel,
         "fax": fax,
@@ -93,34 +108,79 @@ def scrape_agence_detail(url, agence_type):
     }
 
 
+def fetch_agence(session, url, agence_type, page_state, known):
+    """
+    Returns (record, page_state, status) with status "unchanged", "updated" or "failed".
+    A 304 or an identical body reuses the known record without parsing.
+    """
+    if known is not None and time.time() - page_state.get("checked_at", 0) < REFRESH_AFTER:
+        return known, page_state, "unchanged"
+    headers = {}
+    if known is not None and page_state.get("etag"):
+        headers["If-None-Match"] = page_state["etag"]
+    if known is not None and page_state.get("last_modified"):
+        headers["If-Modified-Since"] = page_state["last_modified"]
+    try:
+        resp = session.get(url, headers=headers, timeout=15)
+        if resp.status_code == 304 and known is not None:
+            return known, {**page_state, "checked_at": time.time()}, "unchanged"
+        resp.raise_for_status()
+    except Exception as e:
+        print(f"[ERROR] Failed to scrape {url}: {e}")
+        return known, page_state, "failed"
+
+    new_state = {
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "hash": hashlib.sha1(resp.content).hexdigest(),
+        "checked_at": time.time(),
+    }
+    if known is not None and new_state["hash"] == page_state.get("hash") and known.get("type") == agence_type:
+        return known, new_state, "unchanged"
+    print(f"[INFO] Scraped agence detail from: {url}")
+    return parse_agence_detail(resp.content, url, agence_type), new_state, "updated"
+
+
+def record_key(agence):
+    return agence.get("code_agence") or agence["page_url"]
+
+
 def main():
-    all_agences = []
-
-    # AGENT agences
-    agent_url = f"{BASE_URL}/nos-agences?type=52"
-    for url in get_agences_urls(agent_url):
-        try:
-            details = scrape_agence_detail(url, "Agent")
-            all_agences.append(details)
-        except Exception as e:
-            print(f"[ERROR] Failed to scrape {url}: {e}")
-        time.sleep(1)
-
-    # SUCCURSALE agences
-    succ_url = f"{BASE_URL}/nos-agences?type=51"
-    for url in get_agences_urls(succ_url):
-        try:
-            details = scrape_agence_detail(url, "Succursale")
-            all_agences.append(details)
-        except Exception as e:
-            print(f"[ERROR] Failed to scrape {url}: {e}")
-        time.sleep(1)
+    existing = load_json(OUTPUT_FILE, [])
+    state = load_json(STATE_FILE, {})
+    by_url = {a["page_url"]: a for a in existing if a.get("page_url")}
+
+    session = make_session()
+    listing = []
+    for list_url, agence_type in LISTINGS:
+        listing.extend((url, agence_type) for url in get_agences_urls(session, list_url))
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        results = list(pool.map(
+            lambda item: fetch_agence(session, item[0], item[1], state.get(item[0], {}), by_url.get(item[0])),
+            listing,
+        ))
+
+    # Merge keyed by code_agence (page_url when the code is missing), in listing order
+    merged, new_state, counts = {}, {}, {"unchanged": 0, "updated": 0, "failed": 0}
+    for (url, _), (record, page_state, status) in zip(listing, results):
+        counts[status] += 1
+        if record is None:
+            continue
+        merged[record_key(record)] = record
+        new_state[url] = page_state
+    all_agences = list(merged.values())
+    removed = len({record_key(a) for a in existing} - set(merged))
+
+    # Governorates from the bundled gazetteer, in one batch (no geocoding API)
+    assign_gouvernorats(all_agences)
 
     # Save raw JSON list (no title/content)
-    with open("comar_agences_data.json", "w", encoding="utf-8") as f:
-        json.dump(all_agences, f, ensure_ascii=False, indent=2)
+    write_json_atomic(OUTPUT_FILE, all_agences)
+    write_json_atomic(STATE_FILE, new_state)
 
-    print(f"[DONE] Scraped {len(all_agences)} agences. Data saved to comar_agences_data.json")
+    print(f"[DONE] {len(all_agences)} agences ({counts['updated']} updated, {counts['unchanged']} unchanged, "
+          f"{counts['failed']} failed, {removed} removed). Data saved to {OUTPUT_FILE}")
 
 if __name__ == "__main__":
     main()
@@ -1,14 +1,11 @@
 import requests
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
 import os
-import time
 import fitz  # PyMuPDF
 import unicodedata  # 🔹 NEW
 
 BASE_URL = "https://www.comar.tn"
 OUTPUT_DIR = "scraped_comar"
-CRAWLED = set()
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
@@ -33,13 +30,9 @@ def normalize(text):  # 🔹 NEW
         if unicodedata.category(c) != 'Mn'
     )
 
-def ensure_dirs():
+def ensure_dirs(output_dir=OUTPUT_DIR):
     for section in list(SECTION_KEYWORDS) + [OTHER_FOLDER]:
-        os.makedirs(os.path.join(OUTPUT_DIR, section, "pdfs"), exist_ok=True)
-
-def is_valid_url(url):
-    parsed = urlparse(url)
-    return parsed.netloc == urlparse(BASE_URL).netloc and parsed.scheme.startswith("http")
+        os.makedirs(os.path.join(output_dir, section, "pdfs"), exist_ok=True)
 
 def clean_text(text):
     return ' '.join(text.strip().split())
@@ -56,79 +49,46 @@ def classify_section(url, title):  # 🔹 MODIFIED
 
 def extract_pdf_text(pdf_path):
     try:
-        doc = fitz.open(pdf_path)
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        return text.strip()
+        with fitz.open(pdf_path) as doc:
+            return "".join(page.get_text() for page in doc).strip()
     except Exception as e:
         print(f"❌ Failed OCR on {pdf_path}: {e}")
         return ""
 
+def parse_page(html):
+    soup = BeautifulSoup(html, "html.parser")
+    title = clean_text(soup.title.string if soup.title and soup.title.string else "no-title")
+
+    content = []
+    for tag in soup.find_all(["h1", "h2", "h3", "p", "li"]):
+        text = clean_text(tag.get_text())
+        if len(text) > 30:
+            content.append(text)
+
+    return title, '\n'.join(content), soup
+
 def scrape_page(url):
     try:
         response = requests.get(url, headers=HEADERS, timeout=10)
         response.encoding = 'utf-8'
-        soup = BeautifulSoup(response.content, "html.parser")
-        title = clean_text(soup.title.string if soup.title else "no-title")
-
-        content = []
-        for tag in soup.find_all(["h1", "h2", "h3", "p", "li"]):
-            text = clean_text(tag.get_text())
-            if len(text) > 30:
-                content.append(text)
-
-        return title, '\n'.join(content), soup
+        return parse_page(response.content)
     except Exception as e:
         print(f"❌ Failed to scrape {url}: {e}")
         return None, None, None
 
-def save_content(section, title, url, content):
-    filename = os.path.join(OUTPUT_DIR, section, f"{title[:50].replace('/', '-')}.txt")
+def save_content(section, title, url, content, output_dir=OUTPUT_DIR):
+    filename = os.path.join(output_dir, section, f"{title[:50].replace('/', '-')}.txt")
     with open(filename, "w", encoding="utf-8") as f:
         f.write(f"URL: {url}\n\n")
         f.write(content)
-
-def download_pdf(pdf_url, section):
-    try:
-        filename = os.path.basename(urlparse(pdf_url).path)
-        path = os.path.join(OUTPUT_DIR, section, "pdfs", filename)
-
-        if not os.path.exists(path):
-            response = requests.get(pdf_url, headers=HEADERS, timeout=15)
-            if response.status_code == 200 and 'application/pdf' in response.headers.get('Content-Type', ''):
-                with open(path, 'wb') as f:
-                    f.write(response.content)
-                print(f"📄 PDF downloaded: {filename} → {section}")
-
-                # OCR Text Extraction
-                text = extract_pdf_text(path)
-                if text:
-                    txt_path = path.replace('.pdf', '.txt')
-                    with open(txt_path, "w", encoding="utf-8") as f:
-                        f.write(text)
-    except Exception as e:
-        print(f"❌ Failed to download PDF {pdf_url}: {e}")
-
-def crawl(url):
-    if url in CRAWLED:
-        return
-
-    CRAWLED.add(url)
-    title, content, soup = scrape_page(url)
-    if not content:
-        return
-
-    section = classify_section(url, title)
-    save_content(section, title, url, content)
-
-    for a_tag in soup.find_all("a", href=True):
-        new_url = urljoin(BASE_URL, a_tag['href'])
-        if new_url.endswith(".pdf"):
-            download_pdf(new_url, section)
-        elif is_valid_url(new_url) and new_url not in CRAWLED:
-            time.sleep(0.5)
-            crawl(new_url)
+    return filename
+
+def crawl(url=BASE_URL):
+    # The recursive crawler hit the recursion limit on deep sites and re-downloaded
+    # everything on each run: delegate to the async, resumable crawler.
+    import asyncio
+    from crawler import Crawler
+    return asyncio.run(Crawler(url, OUTPUT_DIR).run())
 
 if __name__ == "__main__":
     ensure_dirs()
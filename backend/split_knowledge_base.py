@@ -1,5 +1,6 @@
 import os
 import json
+from kb_dedup import dedupe_sections, write_report
 
 base_dir = "scraped_comar"
 output_by_section = {}
@@ -18,7 +19,11 @@ for root, dirs, files in os.walk(base_dir):
                 }
                 output_by_section.setdefault(section, []).append(entry)
 
-# Step 2: Save one JSON file per section
+# Step 2: Strip boilerplate lines and drop exact/near-duplicate pages across sections
+output_by_section, report = dedupe_sections(output_by_section)
+write_report(report)
+
+# Step 3: Save one JSON file per section
 output_folder = "split_knowledge_base"
 os.makedirs(output_folder, exist_ok=True)
 
@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+from crawler import Crawler, STATE_FILE
+
+
+def page(title, paragraph, links=()):
+    anchors = "".join(f'<li><a href="{href}">Lien vers {href}</a></li>' for href in links)
+    return (f"<html><head><title>{title}</title></head><body>"
+            f"<p>{paragraph}</p><ul>{anchors}</ul></body></html>").encode("utf-8")
+
+
+class Site:
+    """Local HTTP site with ETags; records every request it serves."""
+
+    def __init__(self):
+        self.pages = {}
+        self.requests = []
+        self.set("/", page("Accueil COMAR", "Bienvenue sur le site de test de COMAR Assurances.", ["/a", "/b"]))
+        self.set("/a", page("Assurance auto", "Une assurance automobile pour tous les conducteurs.", ["/"]))
+        self.set("/b", page("Assurance habitation", "Protégez votre logement contre l'incendie et le vol."))
+
+    def set(self, path, body):
+        self.pages[path] = (body, f'"{hashlib.sha1(body).hexdigest()}"')
+
+    def paths(self):
+        return [path for path, _ in self.requests]
+
+
+@pytest.fixture
+def site():
+    site = Site()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            site.requests.append((self.path, self.headers.get("If-None-Match")))
+            if self.path not in site.pages:
+                self.send_response(404)
+                self.end_headers()
+                return
+            body, etag = site.pages[self.path]
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    site.url = f"http://127.0.0.1:{server.server_port}/"
+    yield site
+    server.shutdown()
+    server.server_close()
+
+
+def crawl(site, output_dir, **kwargs):
+    crawler = Crawler(site.url, str(output_dir), concurrency=2, delay=0, **kwargs)
+    return crawler, asyncio.run(crawler.run())
+
+
+def urls(entries):
+    return sorted(entry["url"] for entry in entries)
+
+
+def test_first_run_fetches_and_saves_every_page(site, tmp_path):
+    _, manifest = crawl(site, tmp_path)
+
+    assert urls(manifest["added"]) == [site.url, site.url + "a", site.url + "b"]
+    assert sorted(site.paths()) == ["/", "/a", "/b"]
+    for entry in manifest["added"]:
+        with open(entry["file"], encoding="utf-8") as f:
+            assert f.readline() == f"URL: {entry['url']}\n"
+
+
+def test_second_run_sends_validators_and_follows_links_of_304_pages(site, tmp_path):
+    crawl(site, tmp_path)
+    site.requests.clear()
+    site.set("/b", page("Assurance habitation", "Nouvelle offre habitation : incendie, vol et dégâts des eaux."))
+
+    _, manifest = crawl(site, tmp_path)
+
+    # Every request is conditional; "/" answers 304 and its saved links are still crawled
+    assert sorted(site.paths()) == ["/", "/a", "/b"]
+    assert all(etag for _, etag in site.requests)
+    assert manifest["stats"]["not_modified"] == 2
+    assert manifest["added"] == [] and manifest["removed"] == []
+    assert urls(manifest["changed"]) == [site.url + "b"]
+
+
+def test_interrupted_run_resumes_from_its_frontier(site, tmp_path):
+    crawl(site, tmp_path)
+    state_path = os.path.join(tmp_path, STATE_FILE)
+    with open(state_path, encoding="utf-8") as f:
+        state = json.load(f)
+    # Same state as a run killed after "/" and "/a", with "/b" still queued
+    b = site.url + "b"
+    del state["pages"][b]
+    state["run"].update(complete=False, frontier=[b], visited=[site.url, site.url + "a"],
+                        added=[site.url, site.url + "a"], changed=[], gone=[])
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    site.requests.clear()
+
+    crawler, manifest = crawl(site, tmp_path)
+
+    assert crawler.resumed
+    assert site.paths() == ["/b"]
+    assert urls(manifest["added"]) == [site.url, site.url + "a", b]
+    assert manifest["removed"] == []
+    with open(state_path, encoding="utf-8") as f:
+        assert json.load(f)["run"]["complete"] is True
+
+
+def test_fresh_ignores_an_interrupted_run(site, tmp_path):
+    crawl(site, tmp_path)
+    state_path = os.path.join(tmp_path, STATE_FILE)
+    with open(state_path, encoding="utf-8") as f:
+        state = json.load(f)
+    state["run"].update(complete=False, frontier=[site.url + "b"])
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+
+    crawler = Crawler(site.url, str(tmp_path), fresh=True)
+
+    assert not crawler.resumed
+    assert crawler.run_state["frontier"] == [site.url]
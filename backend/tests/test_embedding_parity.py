@@ -0,0 +1,43 @@
+"""
+Parité OnnxEmbedder / SentenceTransformer sur quelques textes, aux seuils de
+parity_embeddings.py. Ignoré tant que export_onnx.py n'a pas produit le modèle
+(ou sans sentence-transformers) ; le benchmark complet reste parity_embeddings.py.
+"""
+import os
+import numpy as np
+import pytest
+
+from controllers.embedding_backend import OnnxEmbedder, ONNX_FILES, onnx_model_dir
+
+MODEL_NAME = os.getenv("EMBED_MODEL", "all-MiniLM-L6-v2")
+MIN_COSINE = {"onnx": 0.99, "onnx-int8": 0.95}
+TEXTS = [
+    "assurance automobile",
+    "Quelles sont les agences COMAR à Sfax ?",
+    "Comment déclarer un sinistre habitation après un dégât des eaux ?",
+    "Rapport annuel 2024 : chiffre d'affaires, résultat net et fonds propres de COMAR Assurances.",
+    "La garantie responsabilité civile couvre les dommages causés aux tiers par le véhicule assuré. " * 20,
+]
+
+
+@pytest.fixture(scope="module")
+def reference():
+    sentence_transformers = pytest.importorskip("sentence_transformers")
+    if not os.path.exists(os.path.join(onnx_model_dir(MODEL_NAME), ONNX_FILES["onnx"])):
+        pytest.skip(f"modèle ONNX absent : lancer `python export_onnx.py --model {MODEL_NAME}`")
+    model = sentence_transformers.SentenceTransformer(MODEL_NAME, device="cpu")
+    return model.encode(TEXTS, convert_to_numpy=True)
+
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx-int8"])
+def test_onnx_embeddings_match_sentence_transformers(reference, backend):
+    embedder = OnnxEmbedder(MODEL_NAME, backend, threads=1)
+
+    batch = embedder.encode(TEXTS, batch_size=2)
+    single = np.stack([embedder.encode(text) for text in TEXTS])
+
+    assert batch.shape == reference.shape and batch.dtype == np.float32
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    for embeddings in (batch, single):
+        cosines = (reference * embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)).sum(axis=1)
+        assert cosines.min() >= MIN_COSINE[backend], cosines
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import httpx
+import pytest
+
+from controllers import mistral_client as mc
+from controllers.mistral_client import MistralClient, CircuitBreaker, CircuitOpenError
+
+CHAT_RESPONSE = {"choices": [{"message": {"content": "Bonjour"}}]}
+
+
+class FakeUpstream:
+    """Réponses servies dans l'ordre par un httpx.MockTransport ; la dernière est répétée."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append(request)
+        response = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        return response() if callable(response) else response
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Remplace asyncio.sleep du client : les délais de retry sont enregistrés, pas attendus."""
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(mc.asyncio, "sleep", fake_sleep)
+    return delays
+
+
+def run(upstream, coroutine_factory, **kwargs):
+    async def main():
+        client = MistralClient(endpoint="https://mistral.test/v1/chat/completions", api_key="test", **kwargs)
+        client._client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+        try:
+            return await coroutine_factory(client)
+        finally:
+            await client.close()
+    return asyncio.run(main())
+
+
+def chat(client):
+    return client.chat({"model": "mistral-small", "messages": []})
+
+
+def test_retries_server_errors_then_succeeds(sleeps):
+    upstream = FakeUpstream(httpx.Response(503), httpx.Response(502), httpx.Response(200, json=CHAT_RESPONSE))
+    breaker = CircuitBreaker(threshold=5)
+
+    assert run(upstream, chat, max_retries=3, breaker=breaker) == CHAT_RESPONSE
+    assert len(upstream.requests) == 3
+    assert len(sleeps) == 2
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_retry_after_header_sets_the_delay(sleeps):
+    upstream = FakeUpstream(
+        httpx.Response(429, headers={"Retry-After": "2"}),
+        httpx.Response(429, headers={"Retry-After": "120"}),
+        httpx.Response(200, json=CHAT_RESPONSE),
+    )
+
+    assert run(upstream, chat, max_retries=3) == CHAT_RESPONSE
+    # Retry-After respecté, plafonné à BACKOFF_MAX
+    assert sleeps == [2.0, mc.BACKOFF_MAX]
+
+
+def test_gives_up_after_max_retries(sleeps):
+    upstream = FakeUpstream(httpx.Response(500))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        run(upstream, chat, max_retries=2, breaker=CircuitBreaker(threshold=10))
+    assert len(upstream.requests) == 3
+
+
+def test_client_errors_are_not_retried(sleeps):
+    upstream = FakeUpstream(httpx.Response(400, json={"message": "bad request"}))
+    breaker = CircuitBreaker(threshold=1)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        run(upstream, chat, max_retries=3, breaker=breaker)
+    assert len(upstream.requests) == 1
+    assert sleeps == []
+    assert breaker.state == "closed"
+
+
+def test_transport_errors_are_retried(sleeps):
+    def refuse():
+        raise httpx.ConnectError("connexion refusée")
+
+    upstream = FakeUpstream(refuse, httpx.Response(200, json=CHAT_RESPONSE))
+
+    assert run(upstream, chat, max_retries=1) == CHAT_RESPONSE
+    assert len(sleeps) == 1
+
+
+def test_breaker_opens_rejects_and_closes_after_a_successful_trial(sleeps):
+    breaker = CircuitBreaker(threshold=2, reset_timeout=30)
+    upstream = FakeUpstream(httpx.Response(503))
+
+    async def scenario(client):
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await chat(client)
+        assert breaker.state == "open"
+
+        # Ouvert : l'appel est refusé sans atteindre l'amont
+        calls = len(upstream.requests)
+        with pytest.raises(CircuitOpenError):
+            await chat(client)
+        assert len(upstream.requests) == calls
+
+        # Semi-ouvert : l'essai échoue, le disjoncteur se rouvre aussitôt
+        breaker.opened_at -= 31
+        assert breaker.state == "half-open"
+        with pytest.raises(httpx.HTTPStatusError):
+            await chat(client)
+        assert breaker.state == "open"
+
+        # Semi-ouvert : l'essai réussit, le disjoncteur se referme
+        breaker.opened_at -= 31
+        upstream.responses = [httpx.Response(200, json=CHAT_RESPONSE)]
+        assert await chat(client) == CHAT_RESPONSE
+        assert breaker.state == "closed" and breaker.failures == 0
+
+    run(upstream, scenario, max_retries=0, breaker=breaker)
+
+
+def test_half_open_lets_a_single_trial_through():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    breaker.opened_at -= 31
+
+    trial = breaker.before_call()
+    assert trial is not None
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    # Essai annulé sans verdict : un autre appel peut le retenter
+    breaker.release_trial(trial)
+    assert breaker.before_call() is not None
+
+
+def test_stream_retries_before_the_first_byte(sleeps):
+    events = [{"choices": [{"delta": {"content": "Bon"}}]}, {"choices": [{"delta": {"content": "jour"}}]}]
+    body = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+    upstream = FakeUpstream(
+        httpx.Response(503, headers={"Retry-After": "1"}),
+        httpx.Response(200, headers={"Content-Type": "text/event-stream"}, text=body),
+    )
+
+    async def collect(client):
+        return [event async for event in client.stream_chat({"model": "mistral-small", "messages": []})]
+
+    assert run(upstream, collect, max_retries=2) == events
+    assert sleeps == [1.0]
+    assert json.loads(upstream.requests[-1].content)["stream"] is True